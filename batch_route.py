@@ -0,0 +1,148 @@
+# file: batch_route.py
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from graph_manager import GraphManager
+from graph_snapshot import GraphSnapshot
+
+_worker_graph = None
+
+
+def _init_worker(snapshot_file, ch_index_file, method):
+    """Process-pool initializer: maps the snapshot once per worker.
+
+    The snapshot is memory-mapped, so every worker shares the same pages
+    of the OS file cache instead of holding its own copy of the graph.
+    """
+    global _worker_graph
+    _worker_graph = GraphManager(backend='csr')
+    _worker_graph.load_graph_from_snapshot(GraphSnapshot.open(snapshot_file))
+    _worker_graph.ch_index_file = ch_index_file
+    # Maps with one-way roads have no hierarchy; find_route falls back to the bidirectional search
+    if method == 'ch' and not _worker_graph.get_csr_graph().directed:
+        _worker_graph.get_contraction_hierarchy()
+
+
+def _route_chunk(pairs, method):
+    """Routes a list of (start, end) pairs; returns (start, end, path, cost) rows in order."""
+    rows = []
+    for start, end in pairs:
+        route = _worker_graph.find_route(start, end, method)
+        rows.append((start, end, route[0], route[1]) if route else (start, end, None, None))
+    return rows
+
+
+def prepare_snapshot(db_name: str, method: str) -> tuple[str, str | None]:
+    """Makes sure the snapshot (and, for 'ch', the route index) next to the DB are current.
+
+    Returns the snapshot and index file names.
+    """
+    from database_manager import DatabaseManager
+    db_manager = DatabaseManager(db_name)
+    try:
+        graph_manager = GraphManager(backend='csr')
+        graph_manager.load_graph(db_manager)  # rewrites the snapshot if it is stale
+        if method == 'ch' and not graph_manager.get_csr_graph().directed:
+            graph_manager.get_contraction_hierarchy()  # builds and saves the index if it is stale
+    finally:
+        db_manager.close()
+    return GraphSnapshot.file_for(db_name), graph_manager.ch_index_file
+
+
+def read_pairs(f, delimiter=','):
+    """Yields (start, end) pairs from a two-column file; a 'start,end' header line is skipped."""
+    for i, row in enumerate(csv.reader(f, delimiter=delimiter)):
+        if len(row) < 2 or (i == 0 and [c.strip().lower() for c in row[:2]] == ['start', 'end']):
+            continue
+        yield row[0].strip(), row[1].strip()
+
+
+def route_pairs(pairs, snapshot_file, ch_index_file=None, method='dijkstra', workers=None, chunk_size=1000):
+    """Routes an iterable of (start, end) pairs across worker processes.
+
+    Pairs are read lazily and sent out ``chunk_size`` at a time, with at
+    most two chunks per worker in flight, so any number of pairs can be
+    streamed. Yields (start, end, path, cost) rows in input order; path and
+    cost are None when there is no route. Queries from the same origin that
+    land in one chunk reuse its shortest-path tree, so input grouped by
+    start location is faster.
+    """
+    workers = workers or os.cpu_count() or 1
+    chunks = iter(lambda: list(islice(pairs, chunk_size)), [])
+    if workers == 1:
+        _init_worker(snapshot_file, ch_index_file, method)
+        for chunk in chunks:
+            yield from _route_chunk(chunk, method)
+        return
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(snapshot_file, ch_index_file, method)) as executor:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(_route_chunk, chunk, method))
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def write_rows(rows, f, fmt='csv') -> tuple[int, int]:
+    """Writes routed rows as CSV (path joined with ';') or NDJSON; returns (rows, unreachable)."""
+    written = unreachable = 0
+    if fmt == 'csv':
+        writer = csv.writer(f)
+        writer.writerow(['start', 'end', 'cost', 'hops', 'path'])
+    for start, end, path, cost in rows:
+        if path is None:
+            unreachable += 1
+        if fmt == 'csv':
+            writer.writerow([start, end, '' if cost is None else cost,
+                             '' if path is None else len(path) - 1, '' if path is None else ';'.join(path)])
+        else:
+            f.write(json.dumps({'start': start, 'end': end, 'cost': cost, 'path': path}) + '\n')
+        written += 1
+    return written, unreachable
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Routes start/end pairs from a file without the GUI.")
+    parser.add_argument('queries', help="CSV file of start,end pairs ('-' for stdin)")
+    parser.add_argument('-o', '--output', default='-', help="output file ('-' for stdout)")
+    parser.add_argument('--db', default='city_map.db', help="SQLite database file")
+    parser.add_argument('--method', choices=GraphManager.METHODS, default='dijkstra')
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument('--chunk-size', type=int, default=1000, help="pairs sent to a worker at a time")
+    parser.add_argument('--format', choices=('csv', 'ndjson'), default='csv')
+    parser.add_argument('--delimiter', default=',', help="column delimiter of the query file")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    snapshot_file, ch_index_file = prepare_snapshot(args.db, args.method)
+    if snapshot_file is None:
+        parser.error("batch routing needs a file-backed database.")
+
+    queries = sys.stdin if args.queries == '-' else open(args.queries, newline='')
+    output = sys.stdout if args.output == '-' else open(args.output, 'w', newline='')
+    try:
+        rows = route_pairs(read_pairs(queries, args.delimiter), snapshot_file, ch_index_file,
+                           args.method, args.workers, args.chunk_size)
+        written, unreachable = write_rows(rows, output, args.format)
+    finally:
+        if queries is not sys.stdin:
+            queries.close()
+        if output is not sys.stdout:
+            output.close()
+    elapsed = time.perf_counter() - started
+    print(f"Routed {written} pairs ({unreachable} without a route) in {elapsed:.2f} s "
+          f"({written / elapsed if elapsed else 0:.0f} pairs/s).", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
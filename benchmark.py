@@ -0,0 +1,310 @@
+# file: benchmark.py
+
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from database_manager import DatabaseManager
+from graph_manager import GraphManager
+
+
+# --- Seeded road-network generators ---
+# Each returns (names, xs, ys, sources, targets, weights) as arrays; roads are undirected
+# and their weights are never below the straight-line distance between their ends.
+
+def _road_weights(rng, xs, ys, sources, targets):
+    """Returns the road lengths: straight-line distance times a random detour factor, to 0.1."""
+    lengths = np.hypot(xs[sources] - xs[targets], ys[sources] - ys[targets])
+    return np.maximum(np.ceil(lengths * rng.uniform(1.0, 1.4, len(lengths)) * 10) / 10, 0.1)
+
+
+def _names(n):
+    return np.array([f"N{i}" for i in range(n)], dtype=object)
+
+
+def generate_grid(n: int, seed=0, spacing=10) -> tuple:
+    """A jittered square grid of about ``n`` locations with roads to the right and below."""
+    rng = np.random.default_rng(seed)
+    side = max(2, math.isqrt(n))
+    n = side * side
+    rows, cols = np.divmod(np.arange(n), side)
+    jitter = spacing // 4
+    xs = cols * spacing + rng.integers(-jitter, jitter + 1, n)
+    ys = rows * spacing + rng.integers(-jitter, jitter + 1, n)
+    ids = np.arange(n).reshape(side, side)
+    sources = np.concatenate([ids[:, :-1].ravel(), ids[:-1, :].ravel()])
+    targets = np.concatenate([ids[:, 1:].ravel(), ids[1:, :].ravel()])
+    return _names(n), xs, ys, sources, targets, _road_weights(rng, xs, ys, sources, targets)
+
+
+def generate_geometric(n: int, seed=0, neighbors=3) -> tuple:
+    """Random points joined to their ``neighbors`` nearest neighbours (a k-NN geometric graph)."""
+    rng = np.random.default_rng(seed)
+    extent = int(math.sqrt(n) * 10)
+    xs = rng.integers(0, extent + 1, n)
+    ys = rng.integers(0, extent + 1, n)
+    _, nearest = cKDTree(np.column_stack([xs, ys])).query(np.column_stack([xs, ys]), k=neighbors + 1)
+    sources = np.repeat(np.arange(n), neighbors)
+    targets = nearest[:, 1:].ravel()
+    # Keep one copy of each road, whichever end found it
+    low, high = np.minimum(sources, targets), np.maximum(sources, targets)
+    pairs = np.unique(low.astype(np.int64) * n + high)
+    keep = pairs // n != pairs % n
+    sources, targets = pairs[keep] // n, pairs[keep] % n
+    return _names(n), xs, ys, sources, targets, _road_weights(rng, xs, ys, sources, targets)
+
+
+def generate_scale_free(n: int, seed=0, m=2) -> tuple:
+    """A Barabasi-Albert preferential-attachment network laid out at random positions."""
+    rng = np.random.default_rng(seed)
+    picker = random.Random(seed)
+    extent = int(math.sqrt(n) * 10)
+    xs = rng.integers(0, extent + 1, n)
+    ys = rng.integers(0, extent + 1, n)
+    sources, targets = [], []
+    # Every node appears here once per road it has, so sampling it is preferential
+    endpoints = list(range(m))
+    for v in range(m, n):
+        chosen = set()
+        while len(chosen) < m:
+            chosen.add(endpoints[picker.randrange(len(endpoints))])
+        for u in chosen:
+            sources.append(v)
+            targets.append(u)
+        endpoints.extend(chosen)
+        endpoints.extend([v] * m)
+    sources, targets = np.array(sources), np.array(targets)
+    return _names(n), xs, ys, sources, targets, _road_weights(rng, xs, ys, sources, targets)
+
+
+GENERATORS = {'grid': generate_grid, 'geometric': generate_geometric, 'scale_free': generate_scale_free}
+
+
+def write_network(db_manager: DatabaseManager, network: tuple) -> tuple[int, int]:
+    """Writes a generated network through the bulk insert paths; returns (locations, roads) added."""
+    names, xs, ys, sources, targets, weights = network
+    num_locations = db_manager.bulk_add_locations(zip(names, xs.tolist(), ys.tolist()))
+    num_roads = db_manager.bulk_add_roads(zip(names[sources], names[targets], weights.tolist()))
+    return num_locations, num_roads
+
+
+# --- Measurements ---
+
+def _timed(fn, *args, **kwargs):
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+
+def _routing_throughput(graph_manager, pairs, method):
+    """Answers every pair once with caching disabled; returns queries per second."""
+    _, elapsed = _timed(lambda: [graph_manager.find_route(s, t, method) for s, t in pairs])
+    return {'queries': len(pairs), 'seconds': elapsed, 'queries_per_sec': len(pairs) / elapsed if elapsed else None}
+
+
+def _k_paths_times(graph_manager, pairs, k):
+    """Times k alternative routes per pair: tree-guided spur searches vs. plain Yen with Dijkstra spurs.
+
+    Both must return the same route costs; pairs where they differ are counted as mismatches.
+    """
+    csr = graph_manager.get_csr_graph()
+    graph_manager.tree_cache.clear()
+    guided, guided_time = _timed(lambda: [graph_manager.k_shortest_paths(s, t, k) for s, t in pairs])
+    naive, naive_time = _timed(lambda: [csr.k_shortest_paths(csr.index[s], csr.index[t], k, guided=False)
+                                        for s, t in pairs])
+    mismatches = sum(len(a) != len(b) or any(not math.isclose(x[1], y.cost, rel_tol=1e-9) for x, y in zip(a, b))
+                     for a, b in zip(guided, naive))
+    return {'k': k, 'queries': len(pairs), 'guided_seconds': guided_time, 'naive_seconds': naive_time,
+            'speedup': naive_time / guided_time if guided_time else None, 'mismatches': mismatches}
+
+
+def _reachability_times(graph_manager, origins, share=0.01):
+    """Times bounded reachability queries against full shortest-path trees from the same origins.
+
+    The budget is chosen so about ``share`` of the map is reachable from the
+    first origin; origins whose reachable sets differ are counted as mismatches.
+    """
+    csr = graph_manager.get_csr_graph()
+    graph_manager.tree_cache.clear()
+    first = csr.single_source(csr.index[origins[0]])[0]
+    budget = float(np.quantile(first[np.isfinite(first)], share))
+    bounded, bounded_time = _timed(lambda: [graph_manager.reachable_within(o, budget) for o in origins])
+    full, full_time = _timed(lambda: [csr.single_source(csr.index[o])[0] for o in origins])
+    mismatches = sum(len(r) != int(np.count_nonzero(dist <= budget)) for r, dist in zip(bounded, full))
+    return {'origins': len(origins), 'budget': budget, 'reached_avg': sum(map(len, bounded)) / len(origins),
+            'bounded_seconds': bounded_time, 'full_tree_seconds': full_time,
+            'speedup': full_time / bounded_time if bounded_time else None, 'mismatches': mismatches}
+
+
+def _render_times(graph_manager, highlight_path):
+    """Times ``CityMapNavigatorApp._draw_graph`` on an off-screen Agg canvas, full map and zoomed in."""
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+    from main_app import CityMapNavigatorApp
+
+    fig = Figure(figsize=(9, 8))
+    app = SimpleNamespace(
+        graph_manager=graph_manager, fig=fig, ax=fig.add_subplot(111), canvas=FigureCanvasAgg(fig),
+        picked_node=None, view_limits=None, highlight_path=None,
+        LABEL_LIMIT=CityMapNavigatorApp.LABEL_LIMIT, EDGE_LABEL_LIMIT=CityMapNavigatorApp.EDGE_LABEL_LIMIT,
+        _on_view_changed=lambda ax: None)
+    _, full = _timed(CityMapNavigatorApp._draw_graph, app, highlight_path)
+
+    csr = graph_manager.get_csr_graph()
+    cx, cy = float(np.median(csr.xs)), float(np.median(csr.ys))
+    half_w = (float(csr.xs.max()) - float(csr.xs.min())) / 20 or 1
+    half_h = (float(csr.ys.max()) - float(csr.ys.min())) / 20 or 1
+    app.view_limits = ((cx - half_w, cx + half_w), (cy - half_h, cy + half_h))
+    _, zoomed = _timed(CityMapNavigatorApp._draw_graph, app, highlight_path)
+    return {'full_view': full, 'zoomed_10pct': zoomed}
+
+
+def run_case(generator: str, n: int, seed: int, queries: int, workdir: str, limits: dict) -> dict:
+    """Generates one network into a fresh database and times every stage on it."""
+    print(f"[{generator} n={n}] generating...", flush=True)
+    network, generate_time = _timed(GENERATORS[generator], n, seed)
+    db_name = os.path.join(workdir, f"{generator}_{n}.db")
+    for suffix in ('', '-wal', '-shm', '.ch.npz', '.graph.snap'):
+        path = (db_name if suffix in ('', '-wal', '-shm') else os.path.splitext(db_name)[0]) + suffix
+        if os.path.exists(path):
+            os.remove(path)
+
+    db = DatabaseManager(db_name)
+    (num_locations, num_roads), write_time = _timed(write_network, db, network)
+    timings = {'generate': generate_time, 'db_write': write_time}
+    result = {'generator': generator, 'requested_nodes': n, 'nodes': num_locations, 'roads': num_roads,
+              'seed': seed, 'timings': timings}
+
+    _, timings['db_fetch'] = _timed(lambda: (db.get_location_table(), db.get_road_ids()))
+    gm = GraphManager(backend='csr', route_cache_size=0, tree_threshold=math.inf)
+    _, timings['graph_load'] = _timed(gm.load_graph_from_db, db)
+    _, timings['csr_build'] = _timed(gm.get_csr_graph)
+    _, timings['networkx_build'] = _timed(lambda: gm.graph)  # the display graph, built from the arrays
+    snapshot_file = os.path.splitext(db_name)[0] + '.graph.snap'
+    _, timings['snapshot_write'] = _timed(gm.write_snapshot, snapshot_file)
+    snapshot_gm = GraphManager(backend='csr')
+    _, timings['snapshot_load'] = _timed(snapshot_gm.load_graph, db, snapshot_file)
+
+    print(f"[{generator} n={n}] routing...", flush=True)
+    rng = np.random.default_rng(seed + 1)
+    names = gm.get_csr_graph().names
+    pairs = [(names[a], names[b]) for a, b in rng.integers(0, len(names), (queries, 2)).tolist()]
+    routing = {}
+    for method in ('dijkstra', 'astar', 'bidirectional'):
+        routing[f'csr_{method}'] = _routing_throughput(gm, pairs, method)
+    if num_locations <= limits['networkx_max_nodes']:
+        gm.set_backend('networkx')
+        routing['networkx_dijkstra'] = _routing_throughput(gm, pairs, 'dijkstra')
+        gm.set_backend('csr')
+    if num_locations <= limits['ch_max_nodes']:
+        gm.ch_index_file = None  # time the build, not a previous run's index
+        _, timings['ch_build'] = _timed(gm.get_contraction_hierarchy)
+        routing['ch'] = _routing_throughput(gm, pairs, 'ch')
+    result['routing'] = routing
+    if num_locations <= limits['k_paths_max_nodes']:
+        k_paths = _k_paths_times(gm, pairs[:limits['k_paths_queries']], limits['k_paths_k'])
+        timings['k_paths_guided'], timings['k_paths_naive'] = k_paths['guided_seconds'], k_paths['naive_seconds']
+        result['k_paths'] = k_paths
+    reachability = _reachability_times(gm, list(dict.fromkeys(s for s, _ in pairs[:limits['reachability_queries']])))
+    timings['reachability_bounded'] = reachability['bounded_seconds']
+    result['reachability'] = reachability
+
+    print(f"[{generator} n={n}] matrices and exports...", flush=True)
+    _, timings['adjacency_sparse'] = _timed(gm.get_adjacency_matrix, sparse=True)
+    _, timings['incidence_sparse'] = _timed(gm.get_incidence_matrix, sparse=True)
+    if num_locations <= limits['dense_max_nodes']:
+        _, timings['adjacency_dense'] = _timed(gm.get_adjacency_matrix)
+        _, timings['incidence_dense'] = _timed(gm.get_incidence_matrix)
+    sources = list(dict.fromkeys(s for s, _ in pairs[:32]))
+    _, timings['distance_matrix_32xN'] = _timed(gm.distance_matrix, sources, list(names), workers=1)
+
+    export_base = os.path.join(workdir, f"{generator}_{n}")
+    _, timings['export_json'] = _timed(gm.export_to_json, export_base + '.json')
+    _, timings['export_csv'] = _timed(gm.export_to_csv, export_base + '_nodes.csv', export_base + '_edges.csv')
+    _, timings['export_ndjson'] = _timed(gm.export_to_ndjson, export_base + '.ndjson')
+    _, timings['export_npz'] = _timed(gm.export_to_npz, export_base + '.npz')
+
+    if num_locations <= limits['render_max_nodes']:
+        print(f"[{generator} n={n}] rendering...", flush=True)
+        route = gm.find_route(*pairs[0])
+        result['render'] = _render_times(gm, route[0] if route else None)
+
+    db.close()
+    return result
+
+
+def compare(results: dict, baseline: dict):
+    """Prints the ratio of every timing to the same case in a baseline run (>1 means slower)."""
+    previous = {(case['generator'], case['requested_nodes']): case for case in baseline['results']}
+    for case in results['results']:
+        old = previous.get((case['generator'], case['requested_nodes']))
+        if old is None:
+            continue
+        print(f"{case['generator']} n={case['requested_nodes']}:")
+        for group in ('timings', 'render'):
+            for key, seconds in case.get(group, {}).items():
+                before = old.get(group, {}).get(key)
+                if before:
+                    print(f"  {key:>22}: {seconds:9.4f} s  x{seconds / before:.2f}")
+        for key, stats in case['routing'].items():
+            before = old['routing'].get(key)
+            if before and before['queries_per_sec'] and stats['queries_per_sec']:
+                print(f"  {key:>22}: {stats['queries_per_sec']:9.1f} q/s x{before['queries_per_sec'] / stats['queries_per_sec']:.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks the navigator on seeded synthetic road networks.")
+    parser.add_argument('--generators', nargs='+', choices=sorted(GENERATORS), default=sorted(GENERATORS))
+    parser.add_argument('--sizes', nargs='+', type=int, default=[100, 1000, 10000],
+                        help="approximate node counts (up to 1000000)")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--queries', type=int, default=200, help="random start/end pairs routed per method")
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--compare', metavar='BASELINE', help="an earlier results file to compare against")
+    parser.add_argument('--workdir', help="where the generated databases and exports go (default: a temp dir)")
+    parser.add_argument('--networkx-max-nodes', type=int, default=100000)
+    parser.add_argument('--ch-max-nodes', type=int, default=20000)
+    parser.add_argument('--dense-max-nodes', type=int, default=2000)
+    parser.add_argument('--render-max-nodes', type=int, default=20000)
+    parser.add_argument('--k-paths-max-nodes', type=int, default=20000)
+    parser.add_argument('--k-paths-queries', type=int, default=20, help="pairs asked for alternative routes")
+    parser.add_argument('--k-paths-k', type=int, default=5, help="alternative routes per pair")
+    parser.add_argument('--reachability-queries', type=int, default=20, help="origins asked for reachable locations")
+    args = parser.parse_args(argv)
+
+    limits = {'networkx_max_nodes': args.networkx_max_nodes, 'ch_max_nodes': args.ch_max_nodes,
+              'dense_max_nodes': args.dense_max_nodes, 'render_max_nodes': args.render_max_nodes,
+              'k_paths_max_nodes': args.k_paths_max_nodes, 'k_paths_queries': args.k_paths_queries,
+              'k_paths_k': args.k_paths_k, 'reachability_queries': args.reachability_queries}
+    results = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': sys.version.split()[0], 'platform': platform.platform(), 'numpy': np.__version__,
+        'cpus': os.cpu_count(), 'seed': args.seed, 'queries': args.queries, 'limits': limits, 'results': [],
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = args.workdir or tmp
+        os.makedirs(workdir, exist_ok=True)
+        for generator in args.generators:
+            for n in args.sizes:
+                results['results'].append(run_case(generator, n, args.seed, args.queries, workdir, limits))
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
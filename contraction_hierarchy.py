@@ -0,0 +1,268 @@
+# file: contraction_hierarchy.py
+
+import heapq
+import math
+import os
+
+import numpy as np
+
+from csr_graph import CSRGraph, SearchResult
+
+
+class ContractionHierarchy:
+    """A contraction-hierarchy index over an undirected road network.
+
+    Nodes are contracted one by one in order of importance; whenever removing
+    a node would lengthen a shortest path between two of its neighbours, a
+    shortcut edge is added. Each node keeps only its "upward" edges (to nodes
+    contracted later), so a query is a bidirectional Dijkstra that only climbs
+    the hierarchy and settles a handful of nodes. ``up_middle`` holds the node
+    a shortcut skips over (-1 for original roads) and is used to unpack paths.
+    """
+
+    FORMAT_VERSION = 1
+
+    def __init__(self, names, rank, up_indptr, up_indices, up_weights, up_middle, version=None):
+        self.names = list(names)
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.rank = rank
+        self.up_indptr = up_indptr
+        self.up_indices = up_indices
+        self.up_weights = up_weights
+        self.up_middle = up_middle
+        self.version = version
+
+    @classmethod
+    def build(cls, csr: CSRGraph, version=None, witness_limit=500,
+              estimate_limit=40) -> 'ContractionHierarchy':
+        """Preprocesses a CSR graph into a hierarchy.
+
+        ``witness_limit`` caps the nodes settled by each witness search; when
+        it is hit a shortcut is added anyway, which is always safe. The node
+        ordering only needs an estimate, so it uses the cheaper ``estimate_limit``.
+        """
+        if csr.directed:
+            raise ValueError("Contraction hierarchies are only supported for undirected graphs.")
+        n = csr.num_nodes
+        # adj[u][v] = (weight, middle) over the not-yet-contracted graph
+        adj = [dict() for _ in range(n)]
+        for u in range(n):
+            for v, w in zip(*csr.neighbors(u)):
+                if v != u and (v not in adj[u] or w < adj[u][v][0]):
+                    adj[u][v] = (w, -1)
+
+        contracted = [False] * n
+        deleted_neighbors = [0] * n
+
+        def witness_distances(source, skip, targets, limit, max_settled):
+            """Dijkstra from ``source`` avoiding ``skip``, bounded by ``limit``."""
+            dist = {source: 0.0}
+            heap = [(0.0, source)]
+            remaining, settled = set(targets), 0
+            while heap and remaining and settled < max_settled:
+                d, u = heapq.heappop(heap)
+                if d > dist[u]:
+                    continue
+                if d > limit:
+                    break
+                settled += 1
+                remaining.discard(u)
+                for v, (w, _) in adj[u].items():
+                    if v == skip:
+                        continue
+                    nd = d + w
+                    if nd < dist.get(v, math.inf):
+                        dist[v] = nd
+                        heapq.heappush(heap, (nd, v))
+            return dist
+
+        def shortcuts_for(v, max_settled):
+            """Returns the shortcuts needed to contract ``v`` as (u, w, weight) triples."""
+            nbrs = list(adj[v].items())
+            needed = []
+            for i, (u, (wu, _)) in enumerate(nbrs):
+                others = nbrs[i + 1:]
+                if not others:
+                    continue
+                limit = wu + max(ww for _, (ww, _) in others)
+                dist = witness_distances(u, v, [x for x, _ in others], limit, max_settled)
+                for x, (wx, _) in others:
+                    via = wu + wx
+                    if dist.get(x, math.inf) > via:
+                        needed.append((u, x, via))
+            return needed
+
+        def priority(v):
+            return len(shortcuts_for(v, estimate_limit)) - len(adj[v]) + deleted_neighbors[v]
+
+        heap = [(priority(v), v) for v in range(n)]
+        heapq.heapify(heap)
+        rank = np.empty(n, dtype=np.int32)
+        up_edges = [None] * n
+        order = 0
+        while heap:
+            _, v = heapq.heappop(heap)
+            if contracted[v]:
+                continue
+            # Lazy update: re-evaluate and postpone if no longer the cheapest
+            current = priority(v)
+            if heap and current > heap[0][0]:
+                heapq.heappush(heap, (current, v))
+                continue
+
+            for u, x, via in shortcuts_for(v, witness_limit):
+                if via < adj[u].get(x, (math.inf,))[0]:
+                    adj[u][x] = (via, v)
+                    adj[x][u] = (via, v)
+            up_edges[v] = adj[v]
+            for u in adj[v]:
+                del adj[u][v]
+                deleted_neighbors[u] += 1
+            adj[v] = {}
+            contracted[v] = True
+            rank[v] = order
+            order += 1
+
+        up_indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum([len(edges) for edges in up_edges], out=up_indptr[1:])
+        m = int(up_indptr[-1])
+        up_indices = np.empty(m, dtype=np.int32)
+        up_weights = np.empty(m, dtype=np.float64)
+        up_middle = np.empty(m, dtype=np.int32)
+        pos = 0
+        for edges in up_edges:
+            for x, (w, middle) in edges.items():
+                up_indices[pos], up_weights[pos], up_middle[pos] = x, w, middle
+                pos += 1
+        return cls(csr.names, rank, up_indptr, up_indices, up_weights, up_middle, version)
+
+    @staticmethod
+    def index_file_for(db_name: str) -> str | None:
+        """Returns the index file stored next to a database (None for in-memory DBs)."""
+        if not db_name or db_name == ':memory:':
+            return None
+        return os.path.splitext(db_name)[0] + '.ch.npz'
+
+    def save(self, filename: str):
+        """Writes the index to a compressed NumPy archive."""
+        with open(filename, 'wb') as f:
+            np.savez_compressed(
+                f, format_version=self.FORMAT_VERSION,
+                version=-1 if self.version is None else self.version,
+                names=np.array(self.names, dtype=str), rank=self.rank,
+                up_indptr=self.up_indptr, up_indices=self.up_indices,
+                up_weights=self.up_weights, up_middle=self.up_middle)
+
+    @classmethod
+    def load(cls, filename: str) -> 'ContractionHierarchy':
+        """Reads an index written by ``save``."""
+        with np.load(filename) as data:
+            if int(data['format_version']) != cls.FORMAT_VERSION:
+                raise ValueError(f"Unsupported index format in '{filename}'.")
+            version = int(data['version'])
+            return cls(data['names'].tolist(), data['rank'], data['up_indptr'], data['up_indices'],
+                       data['up_weights'], data['up_middle'], None if version < 0 else version)
+
+    def is_current(self, names, version) -> bool:
+        """Checks whether the index was built for this map version and node order."""
+        return self.version is not None and self.version == version and self.names == list(names)
+
+    def _up_arcs(self, node):
+        lo, hi = int(self.up_indptr[node]), int(self.up_indptr[node + 1])
+        return range(lo, hi)
+
+    def query(self, source: int, target: int) -> SearchResult:
+        """Finds the shortest path between two node IDs with an upward bidirectional search."""
+        if source == target:
+            return SearchResult([source], 0.0, 1)
+        dists = ({source: 0.0}, {target: 0.0})
+        pred_arcs = ({source: -1}, {target: -1})
+        heaps = ([(0.0, source)], [(0.0, target)])
+        settled = [set(), set()]
+        best, meet = math.inf, None
+        side = 0
+        while heaps[0] or heaps[1]:
+            if not heaps[side]:
+                side = 1 - side
+            d, u = heapq.heappop(heaps[side])
+            dist, pred = dists[side], pred_arcs[side]
+            if u in settled[side] or d > dist[u]:
+                side = 1 - side
+                continue
+            if d >= best:
+                # Nothing on this side can improve the answer any more
+                heaps[side].clear()
+                side = 1 - side
+                continue
+            settled[side].add(u)
+            other = dists[1 - side]
+            if u in other and d + other[u] < best:
+                best, meet = d + other[u], u
+            lo, hi = int(self.up_indptr[u]), int(self.up_indptr[u + 1])
+            for arc, v, w in zip(range(lo, hi), self.up_indices[lo:hi].tolist(),
+                                 self.up_weights[lo:hi].tolist()):
+                nd = d + w
+                if nd < dist.get(v, math.inf):
+                    dist[v] = nd
+                    pred[v] = arc
+                    heapq.heappush(heaps[side], (nd, v))
+            side = 1 - side
+
+        num_settled = len(settled[0]) + len(settled[1])
+        if meet is None:
+            return SearchResult(None, math.inf, num_settled)
+        forward = self._arc_chain(pred_arcs[0], meet)
+        backward = self._arc_chain(pred_arcs[1], meet)
+        path = [source]
+        for lower, arc in forward:
+            self._unpack(lower, arc, path, reverse=False)
+        for lower, arc in reversed(backward):
+            self._unpack(lower, arc, path, reverse=True)
+        return SearchResult(path, best, num_settled)
+
+    def _arc_chain(self, pred, node):
+        """Returns the (lower node, arc) pairs leading from a search root up to ``node``."""
+        chain = []
+        while pred[node] != -1:
+            arc = pred[node]
+            lower = int(np.searchsorted(self.up_indptr, arc, side='right')) - 1
+            chain.append((lower, arc))
+            node = lower
+        chain.reverse()
+        return chain
+
+    def _find_up_arc(self, lower, upper):
+        for arc in self._up_arcs(lower):
+            if self.up_indices[arc] == upper:
+                return arc
+        raise KeyError((lower, upper))
+
+    def _unpack(self, lower, arc, path, reverse):
+        """Appends the original nodes of an up-arc to ``path``, excluding its first endpoint.
+
+        With ``reverse=False`` the arc is walked lower -> upper, otherwise upper -> lower.
+        """
+        upper = int(self.up_indices[arc])
+        middle = int(self.up_middle[arc])
+        if middle == -1:
+            path.append(lower if reverse else upper)
+            return
+        # The middle node was contracted before both endpoints
+        to_lower = self._find_up_arc(middle, lower)
+        to_upper = self._find_up_arc(middle, upper)
+        if reverse:
+            self._unpack(middle, to_upper, path, reverse=True)
+            self._unpack(middle, to_lower, path, reverse=False)
+        else:
+            self._unpack(middle, to_lower, path, reverse=True)
+            self._unpack(middle, to_upper, path, reverse=False)
+
+    def shortest_path(self, start_name: str, end_name: str) -> SearchResult | None:
+        """Finds the shortest path between two location names, unpacking shortcuts."""
+        source, target = self.index.get(start_name), self.index.get(end_name)
+        if source is None or target is None:
+            return None
+        result = self.query(source, target)
+        if result.path is None:
+            return result
+        return result._replace(path=[self.names[i] for i in result.path])
@@ -0,0 +1,656 @@
+# file: csr_graph.py
+
+import heapq
+import math
+from concurrent.futures import ProcessPoolExecutor
+from itertools import count
+from typing import NamedTuple
+
+import numpy as np
+# SciPy is only needed for matrix queries and is imported there
+
+
+class SearchResult(NamedTuple):
+    """The outcome of a point-to-point search: node-ID path, cost and nodes settled."""
+    path: list | None
+    cost: float
+    settled: int
+
+
+class CSRGraph:
+    """A compact, array-backed (CSR) copy of the road network used for routing.
+
+    Nodes are numbered 0..n-1 in the order of ``names``. The arcs leaving node
+    ``i`` are ``indices[indptr[i]:indptr[i + 1]]`` with the matching
+    ``weights``; an undirected road is stored as one arc in each direction.
+    Node coordinates ``xs``/``ys`` drive the A* heuristic.
+    """
+
+    def __init__(self, names, indptr, indices, weights, xs=None, ys=None, directed=False, index=None):
+        self.names = names
+        # Any mapping with ``get`` works as the index (e.g. a snapshot's name table)
+        self.index = index if index is not None else {name: i for i, name in enumerate(names)}
+        self.indptr = indptr
+        self.indices = indices
+        self.weights = weights
+        self.xs = xs if xs is not None else np.zeros(len(names))
+        self.ys = ys if ys is not None else np.zeros(len(names))
+        self.directed = directed
+        self._reverse = None if directed else self
+        self._scale = None
+
+    @classmethod
+    def from_networkx(cls, graph, weight='weight'):
+        """Builds a CSR graph from a NetworkX graph, keeping its adjacency order.
+
+        An edge whose ``one_way`` attribute names one of its ends only gets
+        the arc leaving that end, and makes the CSR graph directed; its
+        ``return_weight``, if any, weights the opposite arc.
+        """
+        names = list(graph.nodes)
+        index = {name: i for i, name in enumerate(names)}
+        num_arcs = sum(1 for node, nbrs in graph.adjacency() for data in nbrs.values()
+                       if data.get('one_way') in (None, node) or 'return_weight' in data)
+
+        indptr = np.zeros(len(names) + 1, dtype=np.int64)
+        indices = np.empty(num_arcs, dtype=np.int32)
+        weights = np.empty(num_arcs, dtype=np.float64)
+        pos = 0
+        for i, (node, nbrs) in enumerate(graph.adjacency()):
+            for nbr, data in nbrs.items():
+                if data.get('one_way') in (None, node):
+                    weights[pos] = data.get(weight, 1)
+                elif 'return_weight' in data:
+                    weights[pos] = data['return_weight']
+                else:
+                    continue
+                indices[pos] = index[nbr]
+                pos += 1
+            indptr[i + 1] = pos
+
+        coords = [graph.nodes[name].get('pos', (0, 0)) for name in names]
+        xs = np.array([c[0] for c in coords], dtype=np.float64)
+        ys = np.array([c[1] for c in coords], dtype=np.float64)
+        directed = graph.is_directed() or num_arcs < sum(len(nbrs) for _, nbrs in graph.adjacency())
+        return cls(names, indptr, indices, weights, xs, ys, directed=directed)
+
+    @classmethod
+    def from_edge_arrays(cls, names, sources, targets, weights, xs=None, ys=None, directed=False, one_way=None):
+        """Builds a CSR graph from parallel edge arrays of node IDs, without Python-level loops.
+
+        For undirected graphs each edge becomes an arc in both directions,
+        except the edges flagged in the boolean ``one_way`` array, which only
+        get their source -> target arc (making the CSR graph directed).
+        """
+        sources = np.asarray(sources, dtype=np.int32)
+        targets = np.asarray(targets, dtype=np.int32)
+        weights = np.asarray(weights, dtype=np.float64)
+        if not directed:
+            mirror = sources != targets
+            if one_way is not None:
+                one_way = np.asarray(one_way, dtype=bool)
+                mirror &= ~one_way
+                directed = bool(one_way.any())
+            sources, targets, weights = (np.concatenate([sources, targets[mirror]]),
+                                         np.concatenate([targets, sources[mirror]]),
+                                         np.concatenate([weights, weights[mirror]]))
+        order = np.argsort(sources, kind='stable')
+        indptr = np.zeros(len(names) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=len(names)), out=indptr[1:])
+        xs = None if xs is None else np.asarray(xs, dtype=np.float64)
+        ys = None if ys is None else np.asarray(ys, dtype=np.float64)
+        return cls(names, indptr, targets[order], weights[order], xs, ys, directed=directed)
+
+    @property
+    def num_nodes(self) -> int:
+        return len(self.names)
+
+    @property
+    def num_arcs(self) -> int:
+        return len(self.indices)
+
+    def nbytes(self) -> int:
+        """Returns the memory used by the CSR arrays, in bytes."""
+        return self.indptr.nbytes + self.indices.nbytes + self.weights.nbytes
+
+    def arc_sources(self) -> np.ndarray:
+        """Returns the source node of every arc, aligned with ``indices``."""
+        return np.repeat(np.arange(self.num_nodes, dtype=np.int32), np.diff(self.indptr))
+
+    def edge_arrays(self) -> tuple:
+        """Returns ``(sources, targets, weights, one_way)`` with one entry per road.
+
+        Undirected graphs keep one arc of each pair. In directed graphs an
+        arc whose reverse exists with the same weight is a two-way road;
+        every other arc is a one-way road.
+        """
+        sources = self.arc_sources()
+        if not self.directed:
+            keep = sources <= self.indices
+            return sources[keep], self.indices[keep], self.weights[keep], np.zeros(int(keep.sum()), dtype=bool)
+        n = np.int64(self.num_nodes)
+        keys = sources.astype(np.int64) * n + self.indices
+        reverse_keys = self.indices.astype(np.int64) * n + sources
+        order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[order]
+        pos = np.minimum(np.searchsorted(sorted_keys, reverse_keys), max(len(keys) - 1, 0))
+        two_way = np.zeros(len(keys), dtype=bool)
+        if len(keys):
+            found = order[pos]
+            two_way = (sorted_keys[pos] == reverse_keys) & (self.weights[found] == self.weights)
+        keep = ~two_way | (sources <= self.indices)
+        return sources[keep], self.indices[keep], self.weights[keep], ~two_way[keep]
+
+    def reverse(self) -> 'CSRGraph':
+        """Returns the graph with every arc flipped (the graph itself if undirected)."""
+        if self._reverse is None:
+            sources = self.arc_sources()
+            order = np.argsort(self.indices, kind='stable')
+            indptr = np.zeros(self.num_nodes + 1, dtype=np.int64)
+            np.cumsum(np.bincount(self.indices, minlength=self.num_nodes), out=indptr[1:])
+            self._reverse = CSRGraph(self.names, indptr, sources[order], self.weights[order],
+                                     self.xs, self.ys, directed=True)
+            self._reverse._reverse = self
+        return self._reverse
+
+    @property
+    def heuristic_scale(self) -> float:
+        """The largest factor k with k * straight-line distance <= weight on every arc.
+
+        Scaling coordinate distances by k keeps the A* heuristic admissible
+        (and consistent) whatever units the road weights are in. It is shaved
+        by a relative 1e-9 so floating-point rounding never overestimates.
+        """
+        if self._scale is None:
+            sources = self.arc_sources()
+            lengths = np.hypot(self.xs[sources] - self.xs[self.indices],
+                               self.ys[sources] - self.ys[self.indices])
+            mask = lengths > 0
+            ratios = self.weights[mask] / lengths[mask]
+            self._scale = float(ratios.min()) * (1 - 1e-9) if mask.any() else 0.0
+        return self._scale
+
+    def arc_positions(self, u: int, v: int) -> list:
+        """Returns the positions in ``indices``/``weights`` of the arcs from u to v."""
+        lo, hi = int(self.indptr[u]), int(self.indptr[u + 1])
+        return (lo + np.flatnonzero(self.indices[lo:hi] == v)).tolist()
+
+    def set_road_weight(self, a: int, b: int, weight: float) -> list:
+        """Gives the arcs between two nodes, in either direction, a new weight in place.
+
+        Returns ``(u, v, old, new)`` for every arc changed. Weights mapped
+        read-only from a snapshot are copied first. The reverse graph and
+        the A* scale are kept in step, so nothing has to be rebuilt.
+        """
+        changed = []
+        for u, v in ((a, b), (b, a)) if a != b else ((a, b),):
+            for i in self.arc_positions(u, v):
+                if self.weights[i] == weight:
+                    continue
+                if not self.weights.flags.writeable:
+                    self.weights = self.weights.copy()
+                changed.append((u, v, float(self.weights[i]), float(weight)))
+                self.weights[i] = weight
+        graphs = [self]
+        reverse = self._reverse
+        if reverse is not None and reverse is not self:
+            graphs.append(reverse)
+            for u, v, _, new in changed:
+                for i in reverse.arc_positions(v, u):
+                    reverse.weights[i] = new
+        for graph in graphs:
+            if graph._scale is not None:
+                # A lighter arc can lower the scale; after a heavier one the old scale is still admissible
+                for u, v, _, new in changed:
+                    length = math.hypot(float(self.xs[u] - self.xs[v]), float(self.ys[u] - self.ys[v]))
+                    if length > 0:
+                        graph._scale = min(graph._scale, new / length * (1 - 1e-9))
+        return changed
+
+    def neighbors(self, node: int) -> tuple[list, list]:
+        """Returns the target nodes and weights of the arcs leaving a node."""
+        lo, hi = int(self.indptr[node]), int(self.indptr[node + 1])
+        return self.indices[lo:hi].tolist(), self.weights[lo:hi].tolist()
+
+    def dijkstra(self, source: int, target: int) -> SearchResult:
+        """Finds the shortest path between two node IDs with a binary-heap Dijkstra.
+
+        Ties are broken exactly like ``nx.dijkstra_path`` so both backends
+        return the same path.
+        """
+        return self.astar(source, target, heuristic=False)
+
+    def astar(self, source: int, target: int, heuristic=True) -> SearchResult:
+        """Finds the shortest path with A*, guided by the scaled straight-line distance.
+
+        With ``heuristic=False`` this is plain Dijkstra.
+        """
+        scale = self.heuristic_scale if heuristic else 0.0
+        tx, ty = float(self.xs[target]), float(self.ys[target])
+        xs, ys = self.xs, self.ys
+
+        def h(node):
+            if not scale:
+                return 0.0
+            return scale * math.hypot(float(xs[node]) - tx, float(ys[node]) - ty)
+
+        dist = {}
+        seen = {source: 0.0}
+        pred = {source: -1}
+        c = count()
+        heap = [(h(source), next(c), source)]
+        while heap:
+            _, _, u = heapq.heappop(heap)
+            if u in dist:
+                continue
+            d = dist[u] = seen[u]
+            if u == target:
+                return SearchResult(self._build_path(pred, target), d, len(dist))
+            for v, w in zip(*self.neighbors(u)):
+                nd = d + w
+                if v in dist:
+                    continue
+                if v not in seen or nd < seen[v]:
+                    seen[v] = nd
+                    pred[v] = u
+                    heapq.heappush(heap, (nd + h(v), next(c), v))
+        return SearchResult(None, math.inf, len(dist))
+
+    def single_source(self, source: int) -> tuple[np.ndarray, np.ndarray]:
+        """Runs a full Dijkstra from ``source`` and returns its shortest-path tree.
+
+        The result is a distance array (inf where unreachable) and a
+        predecessor array (-1 for the source and unreachable nodes). Ties are
+        broken like ``dijkstra`` so tree paths match point-to-point answers.
+        """
+        dist = np.full(self.num_nodes, np.inf)
+        pred = np.full(self.num_nodes, -1, dtype=np.int32)
+        done = set()
+        seen = {source: 0.0}
+        c = count()
+        heap = [(0.0, next(c), source)]
+        while heap:
+            d, _, u = heapq.heappop(heap)
+            if u in done:
+                continue
+            done.add(u)
+            dist[u] = d
+            for v, w in zip(*self.neighbors(u)):
+                nd = d + w
+                if v in done:
+                    continue
+                if v not in seen or nd < seen[v]:
+                    seen[v] = nd
+                    pred[v] = u
+                    heapq.heappush(heap, (nd, next(c), v))
+        return dist, pred
+
+    def k_shortest_paths(self, source: int, target: int, k: int, reverse_tree=None, guided=True, on_found=None) -> list:
+        """Finds up to ``k`` loopless paths between two node IDs, cheapest first (Yen's algorithm).
+
+        Returns a list of ``SearchResult``s; each one's ``settled`` is the
+        number of nodes settled by the spur searches up to the point it was found.
+        With ``guided`` set, one reverse shortest-path tree from ``target``
+        gives every node's exact distance to it. That distance is the A*
+        heuristic for every spur search, and it stays admissible because
+        removing arcs only makes routes longer. When a spur node's own tree
+        path avoids everything removed, that path is used without a search.
+        ``reverse_tree`` can pass in a cached (distance, next hop) pair for
+        that tree. With ``guided=False`` each spur is a plain Dijkstra search.
+        ``on_found(n)`` is called each time the ``n``-th path is found.
+        """
+        if k < 1:
+            return []
+        if source == target:
+            return [SearchResult([source], 0.0, 0)]
+        to_target = next_hop = None
+        if guided:
+            to_target, next_hop = reverse_tree if reverse_tree is not None else self.reverse().single_source(target)
+            to_target = to_target.tolist()
+        first, settled = self._spur_search(source, target, set(), set(), to_target, next_hop)
+        if first is None:
+            return []
+        results = [SearchResult(first[0], first[1], settled)]
+        if on_found is not None:
+            on_found(1)
+        candidates, seen = [], {tuple(first[0])}
+        c = count()
+        while len(results) < k:
+            previous = results[-1].path
+            root_costs = self._prefix_costs(previous)
+            for j in range(len(previous) - 1):
+                root = previous[:j + 1]
+                # Arcs that would repeat an accepted path sharing this root
+                removed = {(p.path[j], p.path[j + 1]) for p in results if len(p.path) > j + 1 and p.path[:j + 1] == root}
+                spur, spur_settled = self._spur_search(previous[j], target, set(root[:-1]), removed, to_target, next_hop)
+                settled += spur_settled
+                if spur is None:
+                    continue
+                path = root[:-1] + spur[0]
+                if tuple(path) not in seen:
+                    seen.add(tuple(path))
+                    heapq.heappush(candidates, (root_costs[j] + spur[1], next(c), path))
+            if not candidates:
+                break
+            cost, _, path = heapq.heappop(candidates)
+            results.append(SearchResult(path, cost, settled))
+            if on_found is not None:
+                on_found(len(results))
+        return results
+
+    def _spur_search(self, source, target, banned, removed, to_target=None, next_hop=None):
+        """Shortest path avoiding the ``banned`` nodes and ``removed`` (u, v) arcs.
+
+        ``to_target``/``next_hop`` are the distance list and next-hop array of
+        the reverse tree from ``target``, or None for plain Dijkstra. Returns
+        ``((path, cost) or None, nodes settled)``.
+        """
+        if to_target is not None:
+            if to_target[source] == math.inf:
+                return None, 0
+            path, u = [source], source
+            while u != target:
+                v = int(next_hop[u])
+                if v in banned or (u, v) in removed:
+                    break
+                path.append(v)
+                u = v
+            else:
+                return (path, to_target[source]), 0
+        dist = {}
+        seen = {source: 0.0}
+        pred = {source: -1}
+        c = count()
+        heap = [(to_target[source] if to_target is not None else 0.0, next(c), source)]
+        while heap:
+            _, _, u = heapq.heappop(heap)
+            if u in dist:
+                continue
+            d = dist[u] = seen[u]
+            if u == target:
+                return (self._build_path(pred, target), d), len(dist)
+            for v, w in zip(*self.neighbors(u)):
+                if v in dist or v in banned or (u, v) in removed:
+                    continue
+                nd = d + w
+                if v not in seen or nd < seen[v]:
+                    h = to_target[v] if to_target is not None else 0.0
+                    if h == math.inf:
+                        continue  # the target cannot be reached from v at all
+                    seen[v] = nd
+                    pred[v] = u
+                    heapq.heappush(heap, (nd + h, next(c), v))
+        return None, len(dist)
+
+    def _prefix_costs(self, path) -> list:
+        """Returns the cost from the start of a node-ID path to each of its nodes."""
+        costs = [0.0]
+        for u, v in zip(path, path[1:]):
+            targets, weights = self.neighbors(u)
+            costs.append(costs[-1] + min(w for t, w in zip(targets, weights) if t == v))
+        return costs
+
+    def repair_tree(self, dist: np.ndarray, pred: np.ndarray, changes) -> int:
+        """Updates a ``single_source`` tree in place after arc weights changed (dynamic SSSP).
+
+        ``changes`` lists ``(u, v, old, new)`` for arcs of this graph whose
+        weights have already been set. In the style of Ramalingam and Reps,
+        the subtree below each tree arc that got heavier is detached and
+        re-attached from its undisturbed in-neighbours, arcs that got
+        lighter seed improvements, and one Dijkstra pass, limited to nodes
+        whose distance actually changes, settles both. Returns the number of
+        nodes whose distance was recomputed.
+
+        Changes are matched to arcs by their ends, so parallel arcs (only
+        possible when building from raw edge arrays; roads loaded through
+        ``GraphManager`` never have them) raise ValueError.
+        """
+        net = {}
+        for u, v, old, new in changes:  # an arc changed twice in one batch counts once
+            if (u, v) not in net and len(self.arc_positions(u, v)) > 1:
+                raise ValueError(f"Cannot repair a tree across parallel arcs from node {u} to node {v}.")
+            net[u, v] = (net.get((u, v), (old,))[0], new)
+        changes = [(u, v, old, new) for (u, v), (old, new) in net.items() if old != new]
+        affected = set()
+        stack = [v for u, v, old, new in changes if new > old and pred[v] == u]
+        while stack:
+            x = stack.pop()
+            if x not in affected:
+                affected.add(x)
+                stack.extend(z for z in self.neighbors(x)[0] if pred[z] == x)
+        for x in affected:
+            dist[x], pred[x] = math.inf, -1
+
+        c = count()
+        heap = []
+        reverse = self.reverse()
+        for x in affected:
+            for y, w in zip(*reverse.neighbors(x)):
+                if y not in affected and dist[y] + w < dist[x]:
+                    dist[x], pred[x] = dist[y] + w, y
+            if dist[x] < math.inf:
+                heap.append((float(dist[x]), next(c), x))
+        for u, v, old, new in changes:
+            if new < old and dist[u] + new < dist[v]:
+                dist[v], pred[v] = dist[u] + new, u
+                heap.append((float(dist[v]), next(c), v))
+        heapq.heapify(heap)
+
+        relabelled = set(affected)
+        while heap:
+            d, _, x = heapq.heappop(heap)
+            if d > dist[x]:
+                continue
+            relabelled.add(x)
+            for z, w in zip(*self.neighbors(x)):
+                nd = d + w
+                if nd < dist[z]:
+                    dist[z], pred[z] = nd, x
+                    heapq.heappush(heap, (nd, next(c), z))
+        return len(relabelled)
+
+    def bounded_dijkstra(self, sources, budget: float) -> dict:
+        """Runs Dijkstra from one or more node IDs, stopping at distance ``budget``.
+
+        Returns ``{node: distance}`` for every node within the budget of its
+        nearest source, in the order settled. Arcs leading past the budget
+        are never queued, so the work grows with the area reached, not with
+        the size of the map.
+        """
+        dist = {}
+        seen = {source: 0.0 for source in sources}
+        heap = [(0.0, source) for source in seen]
+        while heap:
+            d, u = heapq.heappop(heap)
+            if u in dist:
+                continue
+            dist[u] = d
+            for v, w in zip(*self.neighbors(u)):
+                nd = d + w
+                if nd <= budget and v not in dist and (v not in seen or nd < seen[v]):
+                    seen[v] = nd
+                    heapq.heappush(heap, (nd, v))
+        return dist
+
+    def to_scipy(self):
+        """Wraps the arrays in a SciPy CSR matrix (no copy); explicit zeros remain roads."""
+        from scipy.sparse import csr_matrix
+        n = self.num_nodes
+        return csr_matrix((self.weights, self.indices, self.indptr), shape=(n, n))
+
+    def many_to_many(self, sources, targets, return_predecessors=False, workers=1):
+        """Computes shortest-path costs from every source to every target node ID.
+
+        One single-source search runs per source. With ``workers > 1`` the
+        sources are split into chunks solved by a process pool; each worker
+        receives the CSR arrays once, when it starts. Returns the cost matrix
+        (inf where unreachable) and, if requested, one predecessor row per
+        source over all nodes (-1 for the source and unreachable nodes).
+        """
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        if workers <= 1 or len(sources) < 2:
+            return _solve_sources(self.to_scipy(), sources, targets, return_predecessors)
+
+        chunk = max(1, -(-len(sources) // (workers * 4)))
+        chunks = [sources[i:i + chunk] for i in range(0, len(sources), chunk)]
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_matrix_worker,
+                                 initargs=(self.indptr, self.indices, self.weights)) as pool:
+            results = list(pool.map(_solve_worker_chunk, chunks,
+                                    [targets] * len(chunks), [return_predecessors] * len(chunks)))
+        costs = np.vstack([r[0] for r in results])
+        preds = np.vstack([r[1] for r in results]) if return_predecessors else None
+        return costs, preds
+
+    @staticmethod
+    def tree_path(pred, source: int, target: int) -> list | None:
+        """Walks a predecessor array back from ``target``; None if it is not reachable."""
+        path = [target]
+        while path[-1] != source:
+            parent = int(pred[path[-1]])
+            if parent == -1:
+                return None
+            path.append(parent)
+        path.reverse()
+        return path
+
+    def bidirectional_dijkstra(self, source: int, target: int) -> SearchResult:
+        """Finds the shortest path by growing Dijkstra searches from both ends.
+
+        The searches alternate and stop once the smallest keys on both
+        frontiers add up to at least the best meeting cost found so far.
+        """
+        if source == target:
+            return SearchResult([source], 0.0, 1)
+        graphs = (self, self.reverse())
+        dists = ({}, {})
+        seens = ({source: 0.0}, {target: 0.0})
+        preds = ({source: -1}, {target: -1})
+        heaps = ([(0.0, source)], [(0.0, target)])
+        best, meet = math.inf, None
+        side = 0
+        while heaps[0] and heaps[1]:
+            if heaps[0][0][0] + heaps[1][0][0] >= best:
+                break
+            dist, seen, pred, heap = dists[side], seens[side], preds[side], heaps[side]
+            other_seen = seens[1 - side]
+            d, u = heapq.heappop(heap)
+            if u not in dist:
+                dist[u] = d
+                for v, w in zip(*graphs[side].neighbors(u)):
+                    nd = d + w
+                    if v in dist:
+                        continue
+                    if v not in seen or nd < seen[v]:
+                        seen[v] = nd
+                        pred[v] = u
+                        heapq.heappush(heap, (nd, v))
+                    if v in other_seen and seen[v] + other_seen[v] < best:
+                        best, meet = seen[v] + other_seen[v], v
+            side = 1 - side
+
+        settled = len(dists[0]) + len(dists[1])
+        if meet is None:
+            return SearchResult(None, math.inf, settled)
+        path = self._build_path(preds[0], meet)
+        backward = self._build_path(preds[1], meet)
+        path.extend(reversed(backward[:-1]))
+        return SearchResult(path, best, settled)
+
+    @staticmethod
+    def _build_path(pred, target) -> list:
+        path = [target]
+        while pred[path[-1]] != -1:
+            path.append(pred[path[-1]])
+        path.reverse()
+        return path
+
+    def search(self, source: int, target: int, method='dijkstra') -> SearchResult:
+        """Runs one of the point-to-point strategies in ``METHODS`` on node IDs."""
+        if method == 'dijkstra':
+            return self.dijkstra(source, target)
+        if method == 'astar':
+            return self.astar(source, target)
+        if method == 'bidirectional':
+            return self.bidirectional_dijkstra(source, target)
+        raise ValueError(f"Unknown search method '{method}'. Choose from {METHODS}.")
+
+    def shortest_path(self, start_name: str, end_name: str, method='dijkstra') -> SearchResult | None:
+        """Finds the shortest path between two location names.
+
+        Returns None if either location is unknown; the result's ``path`` is a
+        list of names, or None when the locations are not connected.
+        """
+        source, target = self.index.get(start_name), self.index.get(end_name)
+        if source is None or target is None:
+            return None
+        result = self.search(source, target, method)
+        if result.path is None:
+            return result
+        return result._replace(path=[self.names[i] for i in result.path])
+
+
+METHODS = ('dijkstra', 'astar', 'bidirectional')
+
+_worker_matrix = None
+
+
+def _init_matrix_worker(indptr, indices, weights):
+    """Process-pool initializer: keeps one read-only copy of the graph per worker."""
+    from scipy.sparse import csr_matrix
+    global _worker_matrix
+    n = len(indptr) - 1
+    _worker_matrix = csr_matrix((weights, indices, indptr), shape=(n, n))
+
+
+def _solve_worker_chunk(sources, targets, return_predecessors):
+    return _solve_sources(_worker_matrix, sources, targets, return_predecessors)
+
+
+def _solve_sources(matrix, sources, targets, return_predecessors):
+    """Runs one Dijkstra per source and keeps the target columns."""
+    from scipy.sparse.csgraph import dijkstra as csgraph_dijkstra
+    if len(sources) == 0:
+        empty = np.empty((0, len(targets)))
+        return empty, (np.empty((0, matrix.shape[0]), dtype=np.int32) if return_predecessors else None)
+    if return_predecessors:
+        dist, pred = csgraph_dijkstra(matrix, directed=True, indices=sources, return_predecessors=True)
+        pred[pred < 0] = -1
+        return dist[:, targets], pred.astype(np.int32)
+    dist = csgraph_dijkstra(matrix, directed=True, indices=sources)
+    return dist[:, targets], None
+
+
+if __name__ == '__main__':
+    # Compares the CSR engine against the NetworkX backend on the local map.
+    import time
+    from database_manager import DatabaseManager
+    from graph_manager import GraphManager
+
+    db = DatabaseManager()
+    # Without caching, so the second backend is timed searching rather than reading the first one's answers
+    gm = GraphManager(route_cache_size=0, tree_threshold=math.inf)
+    gm.load_graph_from_db(db)
+    db.close()
+    nodes = gm.get_node_names()
+    pairs = [(s, t) for s in nodes for t in nodes if s != t]
+
+    results = {}
+    for backend in GraphManager.BACKENDS:
+        gm.set_backend(backend)
+        gm.find_shortest_path(nodes[0], nodes[-1])  # warm up (builds the CSR arrays)
+        start = time.perf_counter()
+        results[backend] = [gm.find_shortest_path(s, t) for s, t in pairs]
+        elapsed = time.perf_counter() - start
+        print(f"{backend:>8}: {len(pairs)} queries in {elapsed * 1000:.2f} ms")
+
+    mismatches = sum(a != b for a, b in zip(results['networkx'], results['csr']))
+    print(f"Path mismatches between backends: {mismatches}")
+
+    # Search-space size of each strategy on the longest route in the map.
+    csr = gm.get_csr_graph()
+    longest = max(pairs, key=lambda p: (csr.shortest_path(*p).cost, p))
+    print(f"Nodes settled for {longest[0]} -> {longest[1]}:")
+    for method in METHODS:
+        result = csr.shortest_path(*longest, method=method)
+        print(f"{method:>14}: {result.settled:>6} settled, cost {result.cost:g}")
@@ -1,16 +1,41 @@
 # file: database_manager.py
 
+import csv
+import json
 import sqlite3
+from itertools import islice
+
+from instrumentation import instrument
+
+JOURNAL_MODES = ('DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF')
+SYNCHRONOUS_LEVELS = ('OFF', 'NORMAL', 'FULL', 'EXTRA')
 
 class DatabaseManager:
     """A class to manage the SQLite database for the city map."""
     
-    def __init__(self, db_name='city_map.db'):
-        """Initializes the database connection and creates tables if they don't exist."""
+    def __init__(self, db_name='city_map.db', journal_mode='WAL', synchronous='NORMAL'):
+        """Initializes the database connection and creates tables if they don't exist.
+
+        ``journal_mode`` and ``synchronous`` set the matching SQLite pragmas;
+        pass None to keep SQLite's defaults.
+        """
+        self.db_name = db_name
         self.conn = sqlite3.connect(db_name)
         self.cursor = self.conn.cursor()
+        self.configure(journal_mode, synchronous)
         self._create_tables()
 
+    def configure(self, journal_mode=None, synchronous=None):
+        """Applies the journal mode and synchronous pragmas."""
+        if journal_mode is not None:
+            if journal_mode.upper() not in JOURNAL_MODES:
+                raise ValueError(f"Unknown journal mode '{journal_mode}'. Choose from {JOURNAL_MODES}.")
+            self.cursor.execute(f"PRAGMA journal_mode = {journal_mode.upper()}")
+        if synchronous is not None:
+            if synchronous.upper() not in SYNCHRONOUS_LEVELS:
+                raise ValueError(f"Unknown synchronous level '{synchronous}'. Choose from {SYNCHRONOUS_LEVELS}.")
+            self.cursor.execute(f"PRAGMA synchronous = {synchronous.upper()}")
+
     def _create_tables(self):
         """Creates the 'locations' and 'roads' tables."""
         self.cursor.execute('''
@@ -27,36 +52,72 @@ class DatabaseManager:
                 start_location_id INTEGER,
                 end_location_id INTEGER,
                 weight REAL NOT NULL,
+                one_way INTEGER NOT NULL DEFAULT 0,
                 FOREIGN KEY (start_location_id) REFERENCES locations(id),
                 FOREIGN KEY (end_location_id) REFERENCES locations(id)
             )
         ''')
+        self._migrate_roads()
+        # Lets delete_location and the road JOINs look up roads by endpoint
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_roads_start ON roads(start_location_id)")
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_roads_end ON roads(end_location_id)")
         self.conn.commit()
 
+    def _migrate_roads(self):
+        """Upgrades a roads table that stored every road twice, once per direction.
+
+        Adds the ``one_way`` column and deletes the second row of each mirrored
+        pair, so each two-way road is stored once.
+        """
+        self.cursor.execute("PRAGMA table_info(roads)")
+        if any(column[1] == 'one_way' for column in self.cursor.fetchall()):
+            return
+        try:
+            self.cursor.execute("ALTER TABLE roads ADD COLUMN one_way INTEGER NOT NULL DEFAULT 0")
+            self.cursor.execute('''
+                DELETE FROM roads WHERE id IN (
+                    SELECT r2.id FROM roads r1
+                    JOIN roads r2 ON r2.start_location_id = r1.end_location_id
+                                 AND r2.end_location_id = r1.start_location_id
+                                 AND r2.weight = r1.weight AND r2.id > r1.id
+                )
+            ''')
+            self._bump_change_version()
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+
+    @instrument()
     def add_location(self, name: str, x: int, y: int) -> bool:
         """Adds a new location (node) to the database."""
         try:
             self.cursor.execute("INSERT INTO locations (name, x, y) VALUES (?, ?, ?)", (name, x, y))
+            self._bump_change_version()
             self.conn.commit()
             return True
         except sqlite3.IntegrityError:
             print(f"Error: Location '{name}' already exists.")
             return False
 
-    def add_road(self, start_name: str, end_name: str, weight: float) -> bool:
-        """Adds a new road (edge) between two locations."""
+    @instrument()
+    def add_road(self, start_name: str, end_name: str, weight: float, one_way=False) -> bool:
+        """Adds a new road (edge) between two locations.
+
+        Roads are two-way unless ``one_way``, in which case they can only be
+        travelled from ``start_name`` to ``end_name``. When loaded, a later
+        road replaces earlier ones in the directions it covers, so a one-way
+        road each way models a dual carriageway.
+        """
         try:
             start_id = self._get_location_id(start_name)
             end_id = self._get_location_id(end_name)
             if start_id is not None and end_id is not None:
                 self.cursor.execute(
-                    "INSERT INTO roads (start_location_id, end_location_id, weight) VALUES (?, ?, ?)",
-                    (start_id, end_id, weight)
-                )
-                self.cursor.execute(
-                    "INSERT INTO roads (start_location_id, end_location_id, weight) VALUES (?, ?, ?)",
-                    (end_id, start_id, weight)
+                    "INSERT INTO roads (start_location_id, end_location_id, weight, one_way) VALUES (?, ?, ?, ?)",
+                    (start_id, end_id, weight, int(bool(one_way)))
                 )
+                self._bump_change_version()
                 self.conn.commit()
                 return True
             return False
@@ -64,12 +125,54 @@ class DatabaseManager:
             print(f"Error adding road: {e}")
             return False
             
+    def update_road_weight(self, start_name: str, end_name: str, weight: float) -> bool:
+        """Changes the weight of the road joining two locations."""
+        return self.update_road_weights([(start_name, end_name, weight)]) > 0
+
+    @instrument(touched=lambda changed, *_: changed)
+    def update_road_weights(self, updates) -> int:
+        """Sets new weights for many (start_name, end_name, weight) roads in one transaction.
+
+        A road is matched by its two locations in either order. Roads that do
+        not exist or already have the weight are skipped, as in
+        ``GraphManager.update_road_weights``, so the change versions stay in
+        step. A negative weight rejects the whole batch. Returns the number of
+        roads updated.
+        """
+        ids = {}
+        rows = []
+        for start_name, end_name, weight in updates:
+            if weight < 0:
+                print(f"Error: Road weight must not be negative ({start_name} - {end_name}: {weight}).")
+                return 0
+            for name in (start_name, end_name):
+                if name not in ids:
+                    ids[name] = self._get_location_id(name)
+            start_id, end_id = ids[start_name], ids[end_name]
+            if start_id is not None and end_id is not None:
+                rows.append((float(weight), start_id, end_id, end_id, start_id, float(weight)))
+        try:
+            before = self.conn.total_changes
+            self.cursor.executemany(
+                "UPDATE roads SET weight = ? WHERE ((start_location_id = ? AND end_location_id = ?)"
+                " OR (start_location_id = ? AND end_location_id = ?)) AND weight != ?", rows)
+            changed = self.conn.total_changes - before
+            if changed:
+                self._bump_change_version()
+            self.conn.commit()
+            return changed
+        except Exception as e:
+            print(f"Error updating road weights: {e}")
+            self.conn.rollback()
+            return 0
+
     def _get_location_id(self, name: str) -> int | None:
         """Retrieves the ID of a location by its name."""
         self.cursor.execute("SELECT id FROM locations WHERE name = ?", (name,))
         result = self.cursor.fetchone()
         return result[0] if result else None
 
+    @instrument()
     def delete_location(self, name: str) -> bool:
         """Deletes a location and all associated roads from the database."""
         location_id = self._get_location_id(name)
@@ -82,6 +185,7 @@ class DatabaseManager:
                 (location_id, location_id)
             )
             self.cursor.execute("DELETE FROM locations WHERE id = ?", (location_id,))
+            self._bump_change_version()
             self.conn.commit()
             return True
         except Exception as e:
@@ -90,28 +194,155 @@ class DatabaseManager:
             return False
     
     # <<< START OF ADDED CODE >>>
+    @instrument()
     def update_location_coords(self, name: str, x: int, y: int) -> bool:
         """Updates the coordinates of an existing location."""
         try:
             self.cursor.execute("UPDATE locations SET x = ?, y = ? WHERE name = ?", (x, y, name))
-            self.conn.commit()
             # Check if a row was actually updated
-            return self.cursor.rowcount > 0
+            updated = self.cursor.rowcount > 0
+            if updated:
+                self._bump_change_version()
+            self.conn.commit()
+            return updated
         except Exception as e:
             print(f"Error updating coordinates for '{name}': {e}")
             self.conn.rollback()
             return False
     # <<< END OF ADDED CODE >>>
 
+    def _get_location_ids(self) -> dict:
+        """Returns a name -> ID mapping for every location."""
+        self.cursor.execute("SELECT name, id FROM locations")
+        return dict(self.cursor.fetchall())
+
+    def _executemany_in_batches(self, sql: str, rows, batch_size: int) -> int:
+        """Runs ``sql`` over ``rows`` with one transaction per batch; returns rows changed."""
+        changed = 0
+        rows = iter(rows)
+        while batch := list(islice(rows, batch_size)):
+            try:
+                before = self.conn.total_changes
+                self.cursor.executemany(sql, batch)
+                batch_changed = self.conn.total_changes - before
+                if batch_changed > 0:  # a batch of duplicates leaves the map as it was
+                    self._bump_change_version()
+                changed += batch_changed
+                self.conn.commit()
+            except Exception:
+                self.conn.rollback()
+                raise
+        return changed
+
+    @instrument(touched=lambda changed, *_: changed)
+    def bulk_add_locations(self, locations, batch_size=50000) -> int:
+        """Adds many (name, x, y) locations; existing names are skipped. Returns the number added."""
+        return self._executemany_in_batches(
+            "INSERT OR IGNORE INTO locations (name, x, y) VALUES (?, ?, ?)", locations, batch_size)
+
+    @instrument(touched=lambda changed, *_: changed)
+    def bulk_add_roads(self, roads, batch_size=50000) -> int:
+        """Adds many (start_name, end_name, weight[, one_way]) roads. Returns the number added.
+
+        Names are resolved with a single query up front; roads naming an
+        unknown location are skipped.
+        """
+        ids = self._get_location_ids()
+        skipped = 0
+
+        def rows():
+            nonlocal skipped
+            for start_name, end_name, weight, *one_way in roads:
+                start_id, end_id = ids.get(start_name), ids.get(end_name)
+                if start_id is None or end_id is None:
+                    skipped += 1
+                    continue
+                yield start_id, end_id, weight, int(bool(one_way and one_way[0]))
+
+        added = self._executemany_in_batches(
+            "INSERT INTO roads (start_location_id, end_location_id, weight, one_way) VALUES (?, ?, ?, ?)",
+            rows(), batch_size)
+        if skipped:
+            print(f"Skipped {skipped} roads with unknown locations.")
+        return added
+
+    def import_from_csv(self, node_file='nodes.csv', edge_file='edges.csv', batch_size=50000) -> tuple[int, int]:
+        """Streams locations and roads from the CSV files written by ``GraphManager.export_to_csv``.
+
+        Returns the number of locations and roads added.
+        """
+        with open(node_file, newline='') as f:
+            locations = ((row['name'], int(float(row['x'])), int(float(row['y']))) for row in csv.DictReader(f))
+            num_locations = self.bulk_add_locations(locations, batch_size)
+        with open(edge_file, newline='') as f:
+            roads = ((row['source'], row['target'], float(row.get('weight') or 1), row.get('one_way') in ('1', 'True'))
+                     for row in csv.DictReader(f))
+            num_roads = self.bulk_add_roads(roads, batch_size)
+        return num_locations, num_roads
+
+    def import_from_json(self, filename='graph_data.json', batch_size=50000) -> tuple[int, int]:
+        """Imports the node-link JSON written by ``GraphManager.export_to_json``.
+
+        Returns the number of locations and roads added.
+        """
+        with open(filename) as f:
+            data = json.load(f)
+        locations = ((node['id'], int(node['pos'][0]), int(node['pos'][1])) for node in data['nodes'])
+        num_locations = self.bulk_add_locations(locations, batch_size)
+        links = data.get('links', data.get('edges', []))
+
+        def roads_of(link):
+            weight, one_way = float(link.get('weight', 1)), link.get('one_way')
+            # A one-way road records the location it leaves from
+            start, end = link['source'], link['target']
+            if one_way is not None and one_way != start:
+                start, end = end, start
+            yield start, end, weight, one_way is not None
+            if 'return_weight' in link:  # the opposite road of a dual carriageway
+                yield end, start, float(link['return_weight']), True
+
+        roads = (road for link in links for road in roads_of(link))
+        num_roads = self.bulk_add_roads(roads, batch_size)
+        return num_locations, num_roads
+
+    @instrument()
+    def get_change_version(self) -> int:
+        """Returns the map's change counter, which every successful write increments."""
+        self.cursor.execute("PRAGMA user_version")
+        return self.cursor.fetchone()[0]
+
+    def _bump_change_version(self):
+        """Increments the change counter inside the current transaction."""
+        # Stored in the SQLite header so it persists and commits with the write
+        self.cursor.execute(f"PRAGMA user_version = {self.get_change_version() + 1}")
+
+    @instrument(touched=lambda rows, *_: len(rows))
     def get_all_locations(self) -> list:
         """Fetches all locations from the database."""
         self.cursor.execute("SELECT name, x, y FROM locations")
         return self.cursor.fetchall()
 
+    @instrument(touched=lambda rows, *_: len(rows))
+    def get_location_table(self) -> list:
+        """Fetches (id, name, x, y) for every location, ordered by ID."""
+        self.cursor.execute("SELECT id, name, x, y FROM locations ORDER BY id")
+        return self.cursor.fetchall()
+
+    @instrument(touched=lambda rows, *_: len(rows))
+    def get_road_ids(self) -> list:
+        """Fetches (start_id, end_id, weight, one_way) for every road in insertion order, without JOINs."""
+        self.cursor.execute("SELECT start_location_id, end_location_id, weight, one_way FROM roads ORDER BY id")
+        return self.cursor.fetchall()
+
+    @instrument(touched=lambda rows, *_: len(rows))
     def get_all_roads(self) -> list:
-        """Fetches all roads from the database."""
+        """Fetches all roads from the database as (start_name, end_name, weight, one_way).
+
+        One-way roads run from ``start_name`` to ``end_name``, so the rows
+        can be fed straight back to ``bulk_add_roads``.
+        """
         self.cursor.execute('''
-            SELECT l1.name, l2.name, r.weight 
+            SELECT l1.name, l2.name, r.weight, r.one_way
             FROM roads r
             JOIN locations l1 ON r.start_location_id = l1.id
             JOIN locations l2 ON r.end_location_id = l2.id
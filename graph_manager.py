@@ -1,72 +1,826 @@
 # file: graph_manager.py
 
-import networkx as nx
-import pandas as pd
+# networkx, pandas and SciPy are imported where they are used, so routing from a
+# snapshot (e.g. batch_route.py) starts without loading them
+import csv
 import json
-from networkx.readwrite import json_graph
+import math
+import os
+from itertools import islice
+import numpy as np
+
+from csr_graph import CSRGraph, METHODS as CSR_METHODS
+from contraction_hierarchy import ContractionHierarchy
+from graph_snapshot import GraphSnapshot, NameTable
+from instrumentation import instrument
+from route_cache import LRUCache
+from spatial_index import SpatialGrid
+
+NPZ_FORMAT_VERSION = 2  # version 2 added the one_way column
 
 class GraphManager:
     """A class to manage the NetworkX graph operations."""
 
-    def __init__(self):
-        """Initializes an empty graph."""
-        self.graph = nx.Graph()
+    BACKENDS = ('networkx', 'csr')
+    METHODS = CSR_METHODS + ('ch',)
 
-    def load_graph_from_db(self, db_manager):
-        """Builds the graph using data fetched from the database."""
-        self.graph.clear()
-        
-        # Add nodes with position attributes for plotting
-        locations = db_manager.get_all_locations()
-        for name, x, y in locations:
-            self.graph.add_node(name, pos=(x, y))
-            
-        # Add edges with weight attributes
-        roads = db_manager.get_all_roads()
-        for start, end, weight in roads:
+    def __init__(self, backend='networkx', route_cache_size=4096, tree_cache_size=16, tree_threshold=3):
+        """Initializes an empty graph.
+
+        Routes are memoised in an LRU cache of ``route_cache_size`` start/end
+        pairs. Once an origin has been queried ``tree_threshold`` times its
+        whole shortest-path tree is computed and kept in a second LRU cache
+        of ``tree_cache_size`` origins, so further destinations cost no search.
+        """
+        self._graph = None  # built on first access; see ``graph``
+        self.version = None  # DB change version the graph reflects
+        self.ch_index_file = None
+        self._csr = None
+        self._ch = None
+        self._spatial = None
+        self.last_search_stats = None
+        self.route_cache = LRUCache(route_cache_size)
+        self.tree_cache = LRUCache(tree_cache_size)
+        self.tree_threshold = tree_threshold
+        self._origin_counts = LRUCache(route_cache_size)
+        self.partitions = None  # a PartitionedRouter, when routing over region shards
+        self.set_backend(backend)
+
+    @property
+    def graph(self):
+        """The NetworkX graph; after a snapshot load it is built from the CSR arrays on first access."""
+        if self._graph is None:
+            import networkx as nx
+            graph = nx.Graph()
+            csr = self._csr
+            if csr is None:
+                self._graph = graph
+                return graph
+            names = csr.names
+            graph.add_nodes_from((name, {'pos': (x, y)})
+                                 for name, x, y in zip(names, csr.xs.tolist(), csr.ys.tolist()))
+            sources, targets, weights, one_way = csr.edge_arrays()
+            edges = graph.adj
+            for u, v, w, o in zip(sources.tolist(), targets.tolist(), weights.tolist(), one_way.tolist()):
+                a, b = names[u], names[v]
+                if o and edges[a].get(b, {}).get('one_way') == b:
+                    # The opposite one-way road of a dual carriageway shares the edge
+                    edges[a][b]['return_weight'] = w
+                else:
+                    graph.add_edge(a, b, **({'weight': w, 'one_way': a} if o else {'weight': w}))
+            self._graph = graph
+        return self._graph
+
+    @graph.setter
+    def graph(self, graph):
+        self._graph = graph
+
+    def set_backend(self, backend: str):
+        """Selects the routing engine: 'networkx' or the array-backed 'csr'."""
+        if backend not in self.BACKENDS:
+            raise ValueError(f"Unknown backend '{backend}'. Choose from {self.BACKENDS}.")
+        self.backend = backend
+
+    def use_partitions(self, router):
+        """Routes through a ``partitioning.PartitionedRouter`` instead of the in-memory graph.
+
+        Queries then load only the partitions holding their start and end
+        locations, plus the boundary overlay; pass None to go back.
+
+        The shards are only used while they match the graph's DB version:
+        once an edit or reload moves the graph past the version they were
+        built from, routing falls back to the in-memory graph. Without a
+        loaded graph that cannot be checked here, so check the router with
+        ``is_current`` first.
+        """
+        self.partitions = router
+        self.route_cache.clear()
+
+    def _current_partitions(self):
+        """Returns the partitioned router, dropping it first if the graph has changed since its shards were built."""
+        router = self.partitions
+        if router is not None and self.version is not None and router.version != self.version:
+            print(f"Warning: region shards are out of date (built at version {router.version}, "
+                  f"graph at {self.version}); routing on the in-memory graph.")
+            self.use_partitions(None)  # routes cached from the shards go too
+            return None
+        return router
+
+    @instrument()
+    def get_csr_graph(self) -> CSRGraph:
+        """Returns the CSR copy of the graph, building it on first use."""
+        if self._csr is None:
+            self._csr = CSRGraph.from_networkx(self.graph)
+        return self._csr
+
+    @instrument()
+    def get_contraction_hierarchy(self) -> ContractionHierarchy:
+        """Returns the contraction-hierarchy index for the current graph.
+
+        The index is read from ``ch_index_file`` when that file matches the
+        graph's DB version; otherwise it is rebuilt and saved there.
+        """
+        if self._ch is None:
+            csr = self.get_csr_graph()
+            if self.ch_index_file and os.path.exists(self.ch_index_file):
+                try:
+                    ch = ContractionHierarchy.load(self.ch_index_file)
+                    if ch.is_current(csr.names, self.version):
+                        self._ch = ch
+                except (OSError, ValueError, KeyError) as e:
+                    print(f"Error loading route index '{self.ch_index_file}': {e}")
+            if self._ch is None:
+                self._ch = ContractionHierarchy.build(csr, version=self.version)
+                if self.ch_index_file and self.version is not None:
+                    self._ch.save(self.ch_index_file)
+        return self._ch
+
+    def invalidate(self):
+        """Drops derived routing data after the graph or node positions changed in place."""
+        self._invalidate_engines()
+        self.route_cache.clear()
+
+    def _invalidate_engines(self):
+        """Drops the array-backed engines and the shortest-path trees indexed by them."""
+        if self._graph is None and self._csr is not None:
+            self.graph  # a snapshot-backed graph must be materialised before its arrays go
+        self._csr = None
+        self._ch = None
+        self.tree_cache.clear()
+        self._origin_counts.clear()
+
+    def _drop_routes(self, keep):
+        """Removes cached routes for which ``keep(key, route)`` is false."""
+        for key, route in self.route_cache.items():
+            if not keep(key, route):
+                self.route_cache.pop(key)
+
+    def _record_change(self):
+        """Advances the version after an in-memory change that mirrors one DB write."""
+        if self.version is not None:
+            self.version += 1
+
+    @instrument()
+    def get_spatial_index(self) -> SpatialGrid:
+        """Returns the grid index over node positions, building it on first use."""
+        if self._spatial is None:
+            if self._graph is None and self._csr is not None:
+                csr = self._csr
+                positions = dict(zip(csr.names, zip(csr.xs.tolist(), csr.ys.tolist())))
+            else:
+                positions = dict(self.graph.nodes(data='pos'))
+            self._spatial = SpatialGrid.from_positions(positions)
+        return self._spatial
+
+    def nearest_node(self, x: float, y: float, max_dist=float('inf')) -> str | None:
+        """Returns the location closest to a point, or None if none lies within ``max_dist``."""
+        return self.get_spatial_index().nearest(x, y, max_dist)[0]
+
+    def nodes_in_view(self, xmin: float, xmax: float, ymin: float, ymax: float) -> list:
+        """Returns the locations inside an axis-aligned rectangle."""
+        return self.get_spatial_index().query_rect(xmin, xmax, ymin, ymax)
+
+    def add_node(self, name: str, x: int, y: int):
+        """Adds a location in memory, mirroring ``DatabaseManager.add_location``."""
+        self.graph.add_node(name, pos=(x, y))
+        if self._spatial is not None:
+            self._spatial.insert(name, x, y)
+        self._invalidate_engines()
+        # A new location is isolated, so only routes naming it can change
+        self._drop_routes(lambda key, route: name not in key)
+        self._record_change()
+
+    def add_edge(self, start: str, end: str, weight: float, one_way=False):
+        """Adds a road in memory, mirroring ``DatabaseManager.add_road``.
+
+        A later road replaces earlier ones direction by direction: a two-way
+        road replaces both, a one-way road only its own. A one-way road keeps
+        the location it leaves from in its ``one_way`` attribute; the opposite
+        one-way road of a dual carriageway is kept as its ``return_weight``.
+        """
+        data = self.graph.get_edge_data(start, end)
+        if not one_way or data is None:
             self.graph.add_edge(start, end, weight=weight)
-            
-    def find_shortest_path(self, start_node: str, end_node: str) -> list | None:
-        """Finds the shortest path using Dijkstra's algorithm."""
+            data = self.graph.edges[start, end]
+            data.pop('return_weight', None)
+            data.pop('one_way', None)
+            if one_way:
+                data['one_way'] = start
+        elif data.get('one_way') == start:
+            data['weight'] = weight
+        elif data.get('one_way') == end:
+            data['return_weight'] = weight
+        else:
+            # Only the start -> end direction of a two-way road is replaced
+            data.update(weight=weight, one_way=start, return_weight=data['weight'])
+        self.invalidate()
+        self._record_change()
+
+    def remove_node(self, name: str):
+        """Removes a location and its roads in memory, mirroring ``DatabaseManager.delete_location``."""
+        self.graph.remove_node(name)
+        if self._spatial is not None:
+            self._spatial.remove(name)
+        self._invalidate_engines()
+        # Removing a location only lengthens routes through it; all others stay optimal
+        self._drop_routes(lambda key, route: name not in key and (route[0] is None or name not in route[0]))
+        self._record_change()
+
+    def move_node(self, name: str, x: int, y: int):
+        """Moves a location in memory, mirroring ``DatabaseManager.update_location_coords``.
+
+        Only the A* coordinates change; cached routes and the hierarchy stay valid.
+        """
+        self.graph.nodes[name]['pos'] = (x, y)
+        if self._spatial is not None:
+            self._spatial.move(name, x, y)
+        if self._csr is not None:
+            i = self._csr.index[name]
+            if not self._csr.xs.flags.writeable:
+                # Coordinates mapped from a snapshot are read-only
+                self._csr.xs, self._csr.ys = self._csr.xs.copy(), self._csr.ys.copy()
+            self._csr.xs[i], self._csr.ys[i] = x, y
+            self._csr._scale = None
+        self._record_change()
+
+    def update_road_weight(self, start: str, end: str, weight: float) -> bool:
+        """Changes one road's weight in memory; see ``update_road_weights``."""
+        return self.update_road_weights([(start, end, weight)]) > 0
+
+    @instrument(touched=lambda changed, *_, **__: changed)
+    def update_road_weights(self, updates) -> int:
+        """Applies many (start, end, weight) changes in memory, mirroring ``DatabaseManager.update_road_weights``.
+
+        A road is matched by its two locations in either order. The CSR
+        weights are changed in place and every cached shortest-path tree is
+        repaired incrementally rather than recomputed. Cached routes are
+        dropped only if they use a changed road, or if a lighter road could
+        undercut them; that check uses the straight-line A* lower bound.
+        The contraction hierarchy depends on every weight, so it is rebuilt
+        on its next use. Returns the number of roads changed; like the
+        database, a batch with a negative weight is rejected as a whole.
+        """
+        updates = list(updates)
+        for start, end, weight in updates:
+            if weight < 0:
+                print(f"Error: Road weight must not be negative ({start} - {end}: {weight}).")
+                return 0
+        csr = self.get_csr_graph()
+        changes, roads = [], 0
+        for start, end, weight in updates:
+            a, b = csr.index.get(start), csr.index.get(end)
+            if a is None or b is None:
+                continue
+            changed = csr.set_road_weight(a, b, float(weight))
+            if not changed:
+                continue
+            roads += 1
+            changes.extend(changed)
+            if self._graph is not None and self._graph.has_edge(start, end):
+                data = self._graph.edges[start, end]
+                data['weight'] = float(weight)
+                if 'return_weight' in data:
+                    data['return_weight'] = float(weight)
+        if not changes:
+            return 0
+
+        self._ch = None
+        reverse_changes = [(v, u, old, new) for u, v, old, new in changes]
+        for key, (dist, pred) in self.tree_cache.items():
+            if isinstance(key, tuple):  # a reverse tree from ``reverse_tree``
+                csr.reverse().repair_tree(dist, pred, reverse_changes)
+            else:
+                csr.repair_tree(dist, pred, changes)
+        self._drop_reweighted_routes(csr, changes)
+        self._record_change()
+        return roads
+
+    def _drop_reweighted_routes(self, csr, changes):
+        """Drops the cached routes that weight ``changes`` (arcs of ``csr``) could have altered."""
+        names, xs, ys, scale = csr.names, csr.xs, csr.ys, csr.heuristic_scale
+        changed_arcs = {(names[u], names[v]) for u, v, _, _ in changes}
+        lighter = [(float(xs[u]), float(ys[u]), float(xs[v]), float(ys[v]), new)
+                   for u, v, old, new in changes if new < old]
+
+        def keep(key, route):
+            path, cost = route
+            if path is None:
+                return True  # weights alone never connect two locations
+            if any(arc in changed_arcs for arc in zip(path, path[1:])):
+                return False
+            if lighter:
+                s, t = csr.index[key[0]], csr.index[key[1]]
+                sx, sy, tx, ty = float(xs[s]), float(ys[s]), float(xs[t]), float(ys[t])
+                # The route survives if even a straight run to the arc and on to the end could not beat it
+                for ux, uy, vx, vy, w in lighter:
+                    if scale * math.hypot(ux - sx, uy - sy) + w + scale * math.hypot(tx - vx, ty - vy) < cost:
+                        return False
+            return True
+
+        self._drop_routes(keep)
+
+    @instrument()
+    def sync_with_db(self, db_manager) -> bool:
+        """Reloads the graph only if it has diverged from the database.
+
+        Returns True when a full reload was needed.
+        """
+        if self.version is not None and self.version == db_manager.get_change_version():
+            return False
+        self.load_graph(db_manager)
+        return True
+
+    def get_cache_stats(self) -> dict:
+        """Returns hit/miss/eviction counters for the route and shortest-path-tree caches."""
+        return {'routes': self.route_cache.stats(), 'trees': self.tree_cache.stats()}
+
+    @instrument()
+    def shortest_path_tree(self, source: str) -> tuple | None:
+        """Returns the cached (distance, predecessor) arrays rooted at ``source``, computing them if needed.
+
+        Arrays are indexed by the node IDs of ``get_csr_graph()``.
+        """
+        tree = self.tree_cache.peek(source)
+        if tree is None:
+            csr = self.get_csr_graph()
+            if source not in csr.index:
+                return None
+            tree = csr.single_source(csr.index[source])
+            self.tree_cache.put(source, tree)
+        return tree
+
+    def reverse_tree(self, target: str) -> tuple | None:
+        """Returns the cached (distance, next hop) arrays of every node's shortest route *to* ``target``.
+
+        On a graph without one-way roads this is the tree rooted at ``target``.
+        """
+        csr = self.get_csr_graph()
+        if not csr.directed:
+            return self.shortest_path_tree(target)
+        key = ('to', target)  # never collides with a location name
+        tree = self.tree_cache.peek(key)
+        if tree is None:
+            if target not in csr.index:
+                return None
+            tree = csr.reverse().single_source(csr.index[target])
+            self.tree_cache.put(key, tree)
+        return tree
+
+    @instrument(touched=lambda result, *_, **__: len(result))
+    def k_shortest_paths(self, start_node: str, end_node: str, k=3, on_found=None) -> list:
+        """Returns up to ``k`` alternative routes as ``(path, cost)`` pairs, cheapest first.
+
+        Routes never visit a location twice. They are found with Yen's
+        algorithm on the CSR graph, whatever the backend; every spur search
+        is guided by the cached reverse tree of ``end_node``, so repeated
+        queries to one destination skip that search too. ``on_found(n)`` is
+        called as each route is found, for progress reporting.
+        """
+        csr = self.get_csr_graph()
+        source, target = csr.index.get(start_node), csr.index.get(end_node)
+        if source is None or target is None:
+            return []
+        results = csr.k_shortest_paths(source, target, k, reverse_tree=self.reverse_tree(end_node), on_found=on_found)
+        self.last_search_stats = {'backend': 'csr', 'method': 'yen', 'settled': results[-1].settled if results else 0,
+                                  'cache': None}
+        return [([csr.names[i] for i in r.path], r.cost) for r in results]
+
+    @instrument(touched=lambda result, *_, **__: len(result))
+    def reachable_within(self, origin: str, budget: float) -> dict:
+        """Returns ``{location: distance}`` for every location within ``budget`` of ``origin``, nearest first.
+
+        Roads are followed in their direction of travel. The search stops
+        at the budget, so its cost grows with the area reached rather than
+        the map; a cached shortest-path tree of the origin answers without
+        any search.
+        """
+        csr = self.get_csr_graph()
+        source = csr.index.get(origin)
+        if source is None or budget < 0:
+            return {}
+        tree = self.tree_cache.peek(origin)
+        if tree is not None:
+            dist = tree[0]
+            nodes = np.flatnonzero(np.isfinite(dist) & (dist <= budget))
+            nodes = nodes[np.argsort(dist[nodes], kind='stable')]
+            return {csr.names[i]: float(dist[i]) for i in nodes.tolist()}
+        return {csr.names[i]: d for i, d in csr.bounded_dijkstra([source], budget).items()}
+
+    @instrument(touched=lambda result, *_, **__: sum(len(r) for r in result.values()))
+    def reachable_within_many(self, origins, budget: float) -> dict:
+        """Returns ``{origin: {location: distance}}``, running ``reachable_within`` once per distinct origin."""
+        return {origin: self.reachable_within(origin, budget) for origin in dict.fromkeys(origins)}
+
+    @instrument(touched=lambda result, *_, **__: len(result))
+    def reachable_from_any(self, origins, budget: float) -> dict:
+        """Returns ``{location: distance}`` for every location within ``budget`` of its nearest origin.
+
+        All origins share one bounded search, so this costs about the same
+        as a single ``reachable_within`` over the combined area.
+        """
+        csr = self.get_csr_graph()
+        sources = [csr.index[o] for o in origins if csr.index.get(o) is not None]
+        if not sources or budget < 0:
+            return {}
+        return {csr.names[i]: d for i, d in csr.bounded_dijkstra(sources, budget).items()}
+
+    @instrument(touched=lambda result, *_, **__: result[0].size)
+    def distance_matrix(self, sources: list, targets: list | None = None,
+                        return_predecessors=False, workers=None) -> tuple:
+        """Returns the origin x destination cost matrix for lists of location names.
+
+        ``targets`` defaults to ``sources``. Searches are fanned out over
+        ``workers`` processes (default: one per CPU). Returns ``(costs,
+        predecessors)``: ``costs[i, j]`` is the route cost from ``sources[i]``
+        to ``targets[j]`` (inf if unreachable) and ``predecessors`` is None
+        unless requested, in which case row i is the shortest-path tree of
+        ``sources[i]`` over the node IDs of ``get_csr_graph()``.
+        """
+        csr = self.get_csr_graph()
+        targets = sources if targets is None else targets
+        unknown = [name for name in dict.fromkeys(list(sources) + list(targets)) if name not in csr.index]
+        if unknown:
+            raise ValueError(f"Unknown locations: {', '.join(map(str, unknown))}")
+        if workers is None:
+            workers = os.cpu_count() or 1
+        return csr.many_to_many([csr.index[n] for n in sources], [csr.index[n] for n in targets],
+                                return_predecessors=return_predecessors, workers=workers)
+
+    @instrument()
+    def load_graph(self, db_manager, snapshot_file=None) -> bool:
+        """Loads the graph from its snapshot file, or from the database if the snapshot is stale.
+
+        ``snapshot_file`` defaults to the file next to the database. After a
+        database load the snapshot is rewritten so the next start is fast.
+        Returns True when the snapshot was used.
+        """
+        if snapshot_file is None:
+            snapshot_file = GraphSnapshot.file_for(db_manager.db_name)
+        if snapshot_file and os.path.exists(snapshot_file):
+            try:
+                snapshot = GraphSnapshot.open(snapshot_file)
+                if snapshot.version == db_manager.get_change_version():
+                    self.load_graph_from_snapshot(snapshot)
+                    self.ch_index_file = ContractionHierarchy.index_file_for(db_manager.db_name)
+                    return True
+            except (OSError, ValueError) as e:
+                print(f"Error reading graph snapshot '{snapshot_file}': {e}")
+        self.load_graph_from_db(db_manager)
+        if snapshot_file:
+            self.write_snapshot(snapshot_file)
+        return False
+
+    @instrument()
+    def load_graph_from_snapshot(self, snapshot: GraphSnapshot):
+        """Switches to the memory-mapped arrays of an open snapshot.
+
+        Only the CSR engine is set up; the NetworkX graph is built the first
+        time something asks for it.
+        """
+        self._graph = self._csr = None  # nothing to materialise from the previous arrays
+        self.invalidate()
+        self._csr = snapshot.csr
+        self._spatial = None
+        self.version = snapshot.version
+        self.ch_index_file = None
+
+    @instrument()
+    def write_snapshot(self, filename: str) -> bool:
+        """Writes the current graph to a snapshot file stamped with its DB version."""
+        if self.version is None:
+            print("Error writing graph snapshot: the graph is not tied to a database version.")
+            return False
         try:
-            path = nx.dijkstra_path(self.graph, source=start_node, target=end_node, weight='weight')
-            return path
-        except (nx.NetworkXNoPath, nx.NodeNotFound):
+            GraphSnapshot.write(filename, self.get_csr_graph(), self.version)
+            return True
+        except OSError as e:
+            print(f"Error writing graph snapshot '{filename}': {e}")
+            return False
+
+    @instrument(touched=lambda _, self, *args: self.get_csr_graph().num_nodes)
+    def load_graph_from_db(self, db_manager):
+        """Builds the graph using data fetched from the database.
+
+        Roads are read as location IDs, without joining ``locations`` to get
+        names, and go straight into the CSR arrays; names are only kept as the
+        node lookup table. The NetworkX graph is built from the arrays the
+        first time it is needed.
+        """
+        self._graph = self._csr = None
+        self.invalidate()
+        self._spatial = None
+        self.version = db_manager.get_change_version()
+        self.ch_index_file = ContractionHierarchy.index_file_for(db_manager.db_name)
+        self._csr = self._csr_from_tables(db_manager.get_location_table(), db_manager.get_road_ids())
+
+    @staticmethod
+    def _csr_from_tables(locations: list, roads: list) -> CSRGraph:
+        """Builds a CSR graph from (id, name, x, y) location rows and (start_id, end_id, weight, one_way) road rows."""
+        names = [row[1] for row in locations]
+        ids = np.array([row[0] for row in locations], dtype=np.int64)
+        xs = np.array([row[2] for row in locations], dtype=np.float64)
+        ys = np.array([row[3] for row in locations], dtype=np.float64)
+        road_table = np.array(roads, dtype=np.float64).reshape(len(roads), 4)  # IDs are exact in float64
+        starts, ends = road_table[:, 0].astype(np.int64), road_table[:, 1].astype(np.int64)
+        weights, one_way = road_table[:, 2], road_table[:, 3] != 0
+        # Location IDs are sorted, so a binary search maps them to node IDs
+        sources = np.minimum(np.searchsorted(ids, starts), max(len(ids) - 1, 0))
+        targets = np.minimum(np.searchsorted(ids, ends), max(len(ids) - 1, 0))
+        valid = (ids[sources] == starts) & (ids[targets] == ends) if len(ids) else np.zeros(len(starts), dtype=bool)
+        # A later road replaces earlier ones direction by direction: a two-way road replaces both
+        # directions between its locations, a one-way road only its own
+        n = np.int64(len(ids))
+        rows = np.flatnonzero(valid)
+        mirrored = rows[~one_way[rows] & (sources[rows] != targets[rows])]
+        arc_rows = np.concatenate([rows, mirrored])
+        arc_sources = np.concatenate([sources[rows], targets[mirrored]])
+        arc_targets = np.concatenate([targets[rows], sources[mirrored]])
+        keys = arc_sources * n + arc_targets
+        order = np.lexsort((arc_rows, keys))
+        last = np.ones(len(order), dtype=bool)
+        last[:-1] = keys[order[1:]] != keys[order[:-1]]
+        kept = order[last]
+        # Roads that kept every arc stay as they are; a two-way road that lost one direction becomes one-way
+        complete = (np.bincount(arc_rows[kept], minlength=len(starts))
+                    == np.bincount(arc_rows, minlength=len(starts)))[arc_rows[kept]]
+        select = ~complete | (kept < len(rows))
+        kept, complete = kept[select], complete[select]
+        by_row = np.argsort(arc_rows[kept], kind='stable')
+        kept, complete = kept[by_row], complete[by_row]
+        return CSRGraph.from_edge_arrays(names, arc_sources[kept], arc_targets[kept], weights[arc_rows[kept]], xs, ys,
+                                         one_way=one_way[arc_rows[kept]] | ~complete)
+
+    def find_shortest_path(self, start_node: str, end_node: str, method='dijkstra') -> list | None:
+        """Finds the shortest path using the given search strategy.
+
+        ``method`` is one of 'dijkstra', 'astar' (guided by node coordinates),
+        'bidirectional' or 'ch' (the persisted contraction-hierarchy index,
+        whatever the backend). Search statistics are left in ``last_search_stats``,
+        including the number of nodes settled; the NetworkX backend counts it
+        for 'dijkstra' and 'astar' only, and leaves it None for 'bidirectional'.
+        """
+        route = self.find_route(start_node, end_node, method)
+        return route[0] if route else None
+
+    @instrument()
+    def find_route(self, start_node: str, end_node: str, method='dijkstra') -> tuple[list, float] | None:
+        """Returns ``(path, cost)`` for the shortest route, or None if there is none.
+
+        Answers come from the route cache, then from a cached shortest-path
+        tree of ``start_node``, and only then from a fresh search.
+        """
+        if method not in self.METHODS:
+            raise ValueError(f"Unknown search method '{method}'. Choose from {self.METHODS}.")
+        self.last_search_stats = {'backend': self.backend, 'method': method, 'settled': None, 'cache': None}
+        partitions = self._current_partitions()
+        key = (start_node, end_node)
+        cached = self.route_cache.get(key)
+        if cached is not None:
+            self.last_search_stats.update(cache='route', cost=cached[1])
+            return cached if cached[0] is not None else None
+
+        route = self._route_from_tree(start_node, end_node) if partitions is None else None
+        if route is not None:
+            self.last_search_stats['cache'] = 'tree'
+        else:
+            route = self._search(start_node, end_node, method)
+        self.route_cache.put(key, route)
+        self.last_search_stats['cost'] = route[1]
+        return route if route[0] is not None else None
+
+    def _route_from_tree(self, start_node, end_node):
+        """Serves a route from the origin's shortest-path tree, building the tree for popular origins."""
+        if self.tree_cache.get(start_node) is None:
+            uses = self._origin_counts.peek(start_node, 0) + 1
+            self._origin_counts.put(start_node, uses)
+            index = self.get_csr_graph().index
+            if uses < self.tree_threshold or index.get(start_node) is None or index.get(end_node) is None:
+                return None
+        dist, pred = self.shortest_path_tree(start_node)
+        csr = self.get_csr_graph()
+        source, target = csr.index[start_node], csr.index.get(end_node)
+        if target is None:
             return None
+        path = CSRGraph.tree_path(pred, source, target)
+        if path is None:
+            return None, float('inf')
+        return [csr.names[i] for i in path], float(dist[target])
 
-    def get_adjacency_matrix(self) -> tuple[pd.DataFrame, list]:
-        """Returns the adjacency matrix as a pandas DataFrame."""
-        nodes = list(self.graph.nodes)
-        adj_matrix = nx.to_pandas_adjacency(self.graph, nodelist=nodes, weight='weight')
+    @instrument(touched=lambda _, self, *args, **kwargs: (self.last_search_stats or {}).get('settled'))
+    def _search(self, start_node, end_node, method):
+        """Runs one point-to-point search and returns ``(path, cost)``; path is None if unreachable."""
+        if self.partitions is not None:
+            result = self.partitions.shortest_path(start_node, end_node, method)
+            if result is None:
+                return None, float('inf')
+            self.last_search_stats['settled'] = result.settled
+            return result.path, result.cost
+        use_csr = method == 'ch' or self.backend == 'csr'
+        if method == 'ch' and self.get_csr_graph().directed:
+            # The hierarchy needs two-way roads; maps with one-way roads use the bidirectional CSR search
+            method = 'bidirectional'
+            self.last_search_stats['method'] = method
+        if use_csr:
+            if method == 'ch':
+                result = self.get_contraction_hierarchy().shortest_path(start_node, end_node)
+            else:
+                result = self.get_csr_graph().shortest_path(start_node, end_node, method)
+            if result is None:
+                return None, float('inf')
+            self.last_search_stats['settled'] = result.settled
+            return result.path, result.cost
+        import networkx as nx
+        # NetworkX calls the weight function for each road of every node it expands, that node first
+        expanded = set()
+
+        def weight(u, v, data):
+            expanded.add(u)
+            return self._road_weight(u, v, data)
+
+        try:
+            if method == 'astar':
+                path = nx.astar_path(self.graph, start_node, end_node,
+                                     heuristic=self._astar_heuristic(end_node), weight=weight)
+            elif method == 'bidirectional':
+                # The backward search passes the expanded node second, so it cannot be counted this way
+                path = nx.bidirectional_dijkstra(self.graph, start_node, end_node, weight=self._road_weight)[1]
+            else:
+                path = nx.dijkstra_path(self.graph, source=start_node, target=end_node, weight=weight)
+        except (nx.NetworkXNoPath, nx.NodeNotFound):
+            if method != 'bidirectional':
+                self.last_search_stats['settled'] = len(expanded)
+            return None, float('inf')
+        if method != 'bidirectional':
+            # The target is settled but never expanded
+            self.last_search_stats['settled'] = len(expanded | {end_node})
+        return path, sum(self._road_weight(u, v, self.graph.edges[u, v]) for u, v in zip(path, path[1:]))
+
+    @staticmethod
+    def _road_weight(u, v, data):
+        """NetworkX weight function: the road's weight, or None (impassable) against a one-way road."""
+        one_way = data.get('one_way')
+        return data['weight'] if one_way is None or one_way == u else data.get('return_weight')
+
+    def _oriented_edges(self):
+        """Yields (source, target, data) for every road, with one-way roads in their direction of travel."""
+        for u, v, data in self.graph.edges(data=True):
+            if data.get('one_way') == v:
+                u, v = v, u
+            yield u, v, data
+            if 'return_weight' in data:
+                yield v, u, {'weight': data['return_weight'], 'one_way': v}
+
+    def _astar_heuristic(self, end_node: str):
+        """Returns the scaled straight-line distance heuristic towards ``end_node``."""
+        import networkx as nx
+        if end_node not in self.graph:
+            raise nx.NodeNotFound(f"Target {end_node} is not in G")
+        scale = self.get_csr_graph().heuristic_scale
+        tx, ty = self.graph.nodes[end_node]['pos']
+
+        def heuristic(node, _target):
+            x, y = self.graph.nodes[node]['pos']
+            return scale * ((x - tx) ** 2 + (y - ty) ** 2) ** 0.5
+        return heuristic
+
+    @instrument()
+    def get_adjacency_matrix(self, sparse=False) -> tuple:
+        """Returns the adjacency matrix as a pandas DataFrame, or a SciPy CSR matrix if ``sparse``."""
+        # The CSR arrays are the adjacency matrix already, one-way roads included
+        csr = self.get_csr_graph()
+        nodes = list(csr.names)
+        matrix = csr.to_scipy()
+        if sparse:
+            return matrix, nodes
+        import pandas as pd
+        adj_matrix = pd.DataFrame(matrix.toarray(), index=nodes, columns=nodes)
         return adj_matrix, nodes
 
-    def get_incidence_matrix(self) -> tuple[pd.DataFrame, list, list]:
-        """Returns the incidence matrix as a pandas DataFrame."""
+    @instrument()
+    def get_incidence_matrix(self, sparse=False) -> tuple:
+        """Returns the incidence matrix as a pandas DataFrame, or a SciPy CSR matrix if ``sparse``."""
+        import networkx as nx
         nodes = list(self.graph.nodes)
-        edges = list(self.graph.edges)
+        # Each column runs -1 at the road's source to +1 at its target
+        edges = [(u, v) for u, v, _ in self._oriented_edges()]
         inc_matrix_sparse = nx.incidence_matrix(self.graph, nodelist=nodes, edgelist=edges, oriented=True)
+        if sparse:
+            return inc_matrix_sparse.tocsr(), nodes, edges
+        import pandas as pd
         inc_df = pd.DataFrame(inc_matrix_sparse.toarray(), index=nodes, columns=[str(e) for e in edges])
         return inc_df, nodes, edges
 
+    @instrument()
+    def export_matrix(self, kind='adjacency', filename=None, fmt='coo', chunk_rows=1024):
+        """Streams the adjacency or incidence matrix to a CSV file without densifying it.
+
+        ``fmt='coo'`` writes one ``row,column,value`` line per non-zero entry;
+        ``fmt='dense'`` writes the full table, ``chunk_rows`` rows at a time.
+        """
+        if kind == 'adjacency':
+            matrix, rows = self.get_adjacency_matrix(sparse=True)
+            columns = rows
+        elif kind == 'incidence':
+            matrix, rows, edges = self.get_incidence_matrix(sparse=True)
+            columns = [str(e) for e in edges]
+        else:
+            raise ValueError(f"Unknown matrix kind '{kind}'. Choose 'adjacency' or 'incidence'.")
+        filename = filename or f'{kind}_matrix.csv'
+        with open(filename, 'w', newline='') as f:
+            writer = csv.writer(f)
+            if fmt == 'coo':
+                writer.writerow(['row', 'column', 'value'])
+                for start in range(0, matrix.shape[0], chunk_rows):
+                    block = matrix[start:start + chunk_rows].tocoo()
+                    writer.writerows((rows[start + r], columns[c], v)
+                                     for r, c, v in zip(block.row.tolist(), block.col.tolist(), block.data.tolist()))
+            elif fmt == 'dense':
+                writer.writerow(['node'] + columns)
+                for start in range(0, matrix.shape[0], chunk_rows):
+                    block = matrix[start:start + chunk_rows].toarray()
+                    writer.writerows([rows[start + i]] + values for i, values in enumerate(block.tolist()))
+            else:
+                raise ValueError(f"Unknown export format '{fmt}'. Choose 'coo' or 'dense'.")
+        return filename
+
     def get_node_names(self) -> list:
         """Returns a sorted list of node names."""
+        if self._graph is None and self._csr is not None:
+            names = self._csr.names
+            return names.sorted_names() if isinstance(names, NameTable) else sorted(names)
         return sorted(list(self.graph.nodes))
 
+    @instrument()
     def export_to_json(self, filename='graph_data.json'):
         """Exports the graph data to a JSON file."""
+        from networkx.readwrite import json_graph
         data = json_graph.node_link_data(self.graph)
         with open(filename, 'w') as f:
             json.dump(data, f, indent=4)
 
-    def export_to_csv(self, node_file='nodes.csv', edge_file='edges.csv'):
-        """Exports nodes and edges to separate CSV files."""
+    @instrument()
+    def export_to_csv(self, node_file='nodes.csv', edge_file='edges.csv', chunk_size=10000):
+        """Exports nodes and edges to separate CSV files, writing ``chunk_size`` rows at a time."""
         # Nodes with positions
-        nodes_data = {
-            'name': [n for n in self.graph.nodes],
-            'x': [self.graph.nodes[n]['pos'][0] for n in self.graph.nodes],
-            'y': [self.graph.nodes[n]['pos'][1] for n in self.graph.nodes]
-        }
-        pd.DataFrame(nodes_data).to_csv(node_file, index=False)
-        
+        with open(node_file, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['name', 'x', 'y'])
+            rows = ((n, pos[0], pos[1]) for n, pos in self.graph.nodes(data='pos'))
+            while chunk := list(islice(rows, chunk_size)):
+                writer.writerows(chunk)
+
         # Edges with weights
-        nx.to_pandas_edgelist(self.graph).to_csv(edge_file, index=False)
\ No newline at end of file
+        with open(edge_file, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['source', 'target', 'weight', 'one_way'])
+            rows = ((u, v, data['weight'], int('one_way' in data)) for u, v, data in self._oriented_edges())
+            while chunk := list(islice(rows, chunk_size)):
+                writer.writerows(chunk)
+
+    @instrument()
+    def export_to_ndjson(self, filename='graph_data.ndjson', chunk_size=10000):
+        """Streams the graph as newline-delimited JSON: a header line, then one line per node and per edge."""
+        dumps = json.JSONEncoder(separators=(',', ':')).encode
+        with open(filename, 'w') as f:
+            f.write(dumps({'type': 'graph', 'directed': self.graph.is_directed()}) + '\n')
+            lines = (dumps({'type': 'node', 'id': n, 'pos': list(pos)}) + '\n'
+                     for n, pos in self.graph.nodes(data='pos'))
+            while chunk := list(islice(lines, chunk_size)):
+                f.writelines(chunk)
+            lines = (dumps({'type': 'edge', 'source': u, 'target': v, 'weight': data['weight'],
+                            'one_way': 'one_way' in data}) + '\n'
+                     for u, v, data in self._oriented_edges())
+            while chunk := list(islice(lines, chunk_size)):
+                f.writelines(chunk)
+
+    @instrument()
+    def export_to_npz(self, filename='graph_data.npz'):
+        """Exports the graph as columnar NumPy arrays (names, coordinates, edge endpoints, weights, one-way flags)."""
+        # The CSR arrays already hold every road as integer IDs
+        csr = self.get_csr_graph()
+        sources, targets, weights, one_way = csr.edge_arrays()
+        with open(filename, 'wb') as f:
+            np.savez(f, format_version=NPZ_FORMAT_VERSION, names=np.array(list(csr.names), dtype=str),
+                     x=csr.xs, y=csr.ys, source=sources, target=targets, weight=weights, one_way=one_way)
+
+    @instrument()
+    def load_graph_from_npz(self, filename='graph_data.npz'):
+        """Replaces the graph with one exported by ``export_to_npz``.
+
+        The loaded graph is not tied to a database version, so a later
+        ``sync_with_db`` will reload from the database.
+        """
+        with np.load(filename) as data:
+            if int(data['format_version']) not in (1, NPZ_FORMAT_VERSION):
+                raise ValueError(f"Unsupported graph file format in '{filename}'.")
+            names = data['names'].tolist()
+            xs, ys = data['x'], data['y']
+            sources, targets, weights = data['source'], data['target'], data['weight']
+            one_way = data['one_way'] if 'one_way' in data else None
+        self._graph = self._csr = None
+        self.invalidate()
+        self._spatial = None
+        self.version = None
+        self.ch_index_file = None
+        # Routing can start from the arrays straight away; the NetworkX graph follows when needed
+        self._csr = CSRGraph.from_edge_arrays(names, sources, targets, weights, xs, ys, one_way=one_way)
@@ -0,0 +1,170 @@
+# file: graph_snapshot.py
+
+import bisect
+import mmap
+import os
+import struct
+
+import numpy as np
+
+from csr_graph import CSRGraph
+
+MAGIC = b'PFSNAP\x00\x00'
+FORMAT_VERSION = 2
+FLAG_DIRECTED = 1  # the graph has one-way roads
+# magic, format version, flags, map version, node count, arc count, then 8 section offsets
+HEADER = struct.Struct('<8sIIqqq8q')
+# (name, dtype, length as a function of (nodes, arcs, name bytes))
+SECTIONS = (
+    ('name_offsets', np.int64, lambda n, m, b: n + 1),
+    ('name_blob', np.uint8, lambda n, m, b: b),
+    ('name_order', np.int32, lambda n, m, b: n),
+    ('xs', np.float64, lambda n, m, b: n),
+    ('ys', np.float64, lambda n, m, b: n),
+    ('indptr', np.int64, lambda n, m, b: n + 1),
+    ('indices', np.int32, lambda n, m, b: m),
+    ('weights', np.float64, lambda n, m, b: m),
+)
+
+
+class NameTable:
+    """Location names stored in a snapshot, decoded only when accessed.
+
+    It stands in for the ``names`` list of a ``CSRGraph`` (``table[i]``
+    decodes one name) and its ``index`` attribute for the name -> ID dict,
+    which binary-searches the sorted order, so nothing is built up front.
+    """
+
+    def __init__(self, offsets, blob, order):
+        self._offsets = offsets
+        self._blob = blob
+        self._order = order
+        self.index = NameIndex(self)
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        return bytes(self._blob[self._offsets[i]:self._offsets[i + 1]]).decode('utf-8')
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def __contains__(self, name):
+        return self.index.get(name) is not None
+
+    def __eq__(self, other):
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    def sorted_names(self) -> list:
+        """Returns every name in sorted order."""
+        return [self[int(i)] for i in self._order]
+
+    def _encoded(self, i):
+        return bytes(self._blob[self._offsets[i]:self._offsets[i + 1]])
+
+
+class NameIndex:
+    """A read-only name -> node ID mapping over a ``NameTable``."""
+
+    def __init__(self, table):
+        self._table = table
+
+    def __len__(self):
+        return len(self._table)
+
+    def __contains__(self, name):
+        return self.get(name) is not None
+
+    def __getitem__(self, name):
+        node = self.get(name)
+        if node is None:
+            raise KeyError(name)
+        return node
+
+    def get(self, name, default=None):
+        """Returns the node ID of ``name``, or ``default`` if it is not in the table."""
+        if not isinstance(name, str):
+            return default
+        table, order = self._table, self._table._order
+        # UTF-8 byte order matches code-point order, so the sorted order can be searched by bytes
+        key = name.encode('utf-8')
+        pos = bisect.bisect_left(range(len(order)), key, key=lambda k: table._encoded(int(order[k])))
+        if pos < len(order) and table._encoded(int(order[pos])) == key:
+            return int(order[pos])
+        return default
+
+
+class GraphSnapshot:
+    """A versioned, single-file, memory-mapped copy of the routing graph.
+
+    The file holds a header, then the name table, node coordinates and CSR
+    arrays as raw little-endian sections. Opening it maps the file and wraps
+    each section in a NumPy view, so the cost of opening does not depend on
+    the size of the map; pages are read lazily as queries touch them.
+    """
+
+    def __init__(self, filename, version, arrays, mapped, directed=False):
+        self.filename = filename
+        self.version = version
+        self._mapped = mapped
+        self.names = NameTable(arrays['name_offsets'], arrays['name_blob'], arrays['name_order'])
+        self.csr = CSRGraph(self.names, arrays['indptr'], arrays['indices'], arrays['weights'],
+                            arrays['xs'], arrays['ys'], directed=directed, index=self.names.index)
+
+    @staticmethod
+    def file_for(db_name: str) -> str | None:
+        """Returns the snapshot file stored next to a database (None for in-memory DBs)."""
+        if not db_name or db_name == ':memory:':
+            return None
+        return os.path.splitext(db_name)[0] + '.graph.snap'
+
+    @staticmethod
+    def write(filename: str, csr: CSRGraph, version: int):
+        """Writes a snapshot of a CSR graph, stamped with the DB change version.
+
+        The file is written next to the target and renamed into place, so a
+        reader never sees a half-written snapshot.
+        """
+        encoded = [str(name).encode('utf-8') for name in csr.names]
+        name_offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(e) for e in encoded], out=name_offsets[1:])
+        name_blob = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+        name_order = np.array(sorted(range(len(encoded)), key=encoded.__getitem__), dtype=np.int32)
+        arrays = {
+            'name_offsets': name_offsets, 'name_blob': name_blob, 'name_order': name_order,
+            'xs': csr.xs, 'ys': csr.ys, 'indptr': csr.indptr, 'indices': csr.indices, 'weights': csr.weights,
+        }
+
+        offsets, position = [], HEADER.size
+        for name, dtype, _ in SECTIONS:
+            position = -(-position // 8) * 8  # keep every section 8-byte aligned
+            offsets.append(position)
+            position += np.asarray(arrays[name], dtype=dtype).nbytes
+
+        temp = f"{filename}.tmp"
+        with open(temp, 'wb') as f:
+            flags = FLAG_DIRECTED if csr.directed else 0
+            f.write(HEADER.pack(MAGIC, FORMAT_VERSION, flags, version, csr.num_nodes, csr.num_arcs, *offsets))
+            for (name, dtype, _), offset in zip(SECTIONS, offsets):
+                f.write(b'\x00' * (offset - f.tell()))
+                f.write(np.ascontiguousarray(arrays[name], dtype=np.dtype(dtype).newbyteorder('<')).tobytes())
+        os.replace(temp, filename)
+
+    @classmethod
+    def open(cls, filename: str) -> 'GraphSnapshot':
+        """Maps a snapshot file read-only."""
+        with open(filename, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(mapped) < HEADER.size:
+            raise ValueError(f"'{filename}' is not a graph snapshot.")
+        magic, format_version, flags, version, num_nodes, num_arcs, *offsets = HEADER.unpack_from(mapped, 0)
+        if magic != MAGIC or format_version != FORMAT_VERSION:
+            raise ValueError(f"'{filename}' is not a supported graph snapshot.")
+        # The last name offset is the length of the name blob
+        name_bytes = int(np.frombuffer(mapped, dtype='<i8', count=1, offset=offsets[0] + 8 * num_nodes)[0])
+        arrays = {}
+        for (name, dtype, length), offset in zip(SECTIONS, offsets):
+            count = length(num_nodes, num_arcs, name_bytes)
+            arrays[name] = np.frombuffer(mapped, dtype=np.dtype(dtype).newbyteorder('<'), count=count, offset=offset)
+        return cls(filename, version, arrays, mapped, directed=bool(flags & FLAG_DIRECTED))
@@ -0,0 +1,190 @@
+# file: instrumentation.py
+
+import cProfile
+import functools
+import json
+import os
+import pstats
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+
+class Instrumentation:
+    """Records call counts, latencies and rows/nodes touched for instrumented functions.
+
+    Functions are wrapped with ``instrument``. While recording is disabled a
+    wrapper costs one attribute check before calling straight through, so the
+    decorators can stay on the hot paths permanently. Times are inclusive: a
+    recorded call that makes other recorded calls counts their time too.
+    """
+
+    PERCENTILES = (50, 90, 95, 99)
+
+    def __init__(self, enabled=False, window=5000):
+        """Keeps the last ``window`` latencies of each function for percentiles."""
+        self.enabled = enabled
+        self.window = window
+        self._lock = threading.Lock()
+        self._profiler = None
+        self._thread_profilers = {}  # thread ident -> cProfile.Profile, for ``profile_thread``
+        self._thread_stats = {}  # thread ident -> stats copied when its last profiled block ended
+        self.reset()
+
+    def reset(self):
+        """Forgets every recorded call."""
+        with self._lock:
+            self._counts = defaultdict(int)
+            self._totals = defaultdict(float)
+            self._maxima = defaultdict(float)
+            self._touched = defaultdict(int)
+            self._samples = defaultdict(lambda: deque(maxlen=self.window))
+
+    def record(self, name: str, seconds: float, touched=None):
+        """Adds one call of ``name`` that took ``seconds`` and touched ``touched`` rows/nodes."""
+        with self._lock:
+            self._counts[name] += 1
+            self._totals[name] += seconds
+            self._samples[name].append(seconds)
+            if seconds > self._maxima[name]:
+                self._maxima[name] = seconds
+            if touched:
+                self._touched[name] += touched
+
+    def instrument(self, name=None, touched=None):
+        """Decorator that records each call of the function while recording is enabled.
+
+        ``name`` defaults to the function's qualified name (e.g.
+        ``GraphManager.find_route``). ``touched``, if given, is called as
+        ``touched(result, *args, **kwargs)`` after a successful call and
+        returns the number of rows or nodes the call handled.
+        """
+        def decorator(fn):
+            key = name or fn.__qualname__
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                started = time.perf_counter()
+                count = None
+                try:
+                    result = fn(*args, **kwargs)
+                    if touched is not None:
+                        count = touched(result, *args, **kwargs)
+                    return result
+                finally:
+                    self.record(key, time.perf_counter() - started, count)
+            return wrapper
+        return decorator
+
+    def summary(self) -> dict:
+        """Returns per-function call counts, total/mean/percentile/max latency (ms) and rows touched."""
+        with self._lock:
+            samples = {name: sorted(values) for name, values in self._samples.items()}
+            counts, totals = dict(self._counts), dict(self._totals)
+            maxima, touched = dict(self._maxima), dict(self._touched)
+        report = {}
+        for name, values in samples.items():
+            stats = {'calls': counts[name], 'total_ms': totals[name] * 1000,
+                     'mean_ms': totals[name] / counts[name] * 1000}
+            for p in self.PERCENTILES:
+                rank = min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))
+                stats[f'p{p}_ms'] = values[rank] * 1000
+            stats['max_ms'] = maxima[name] * 1000
+            stats['touched'] = touched.get(name, 0)
+            report[name] = stats
+        return dict(sorted(report.items(), key=lambda item: -item[1]['total_ms']))
+
+    def dump_json(self, filename='profile_stats.json'):
+        """Writes ``summary()`` to a JSON file."""
+        with open(filename, 'w') as f:
+            json.dump(self.summary(), f, indent=2)
+
+    # --- cProfile ---
+
+    @property
+    def profiling(self) -> bool:
+        return self._profiler is not None
+
+    def start_profile(self):
+        """Starts a cProfile session on the calling thread until ``stop_profile``.
+
+        Before Python 3.12 a profiler only sees the thread that enabled it;
+        work on other threads is added by running it in ``profile_thread``.
+        """
+        if self._profiler is None:
+            with self._lock:
+                self._thread_profilers, self._thread_stats = {}, {}
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+
+    @contextmanager
+    def profile_thread(self):
+        """Profiles the ``with`` block into the running cProfile session, from any thread.
+
+        Each thread gets its own profiler. Its stats are copied on that
+        thread when the block ends, so dumping never touches a profiler that
+        is running elsewhere; blocks still running are left out of a dump.
+        """
+        session = self._profiler
+        profiler = None
+        if session is not None:
+            ident = threading.get_ident()
+            with self._lock:
+                profiler = self._thread_profilers.setdefault(ident, cProfile.Profile())
+            try:
+                profiler.enable()
+            except ValueError:  # Python 3.12+: the session's profiler already sees every thread
+                profiler = None
+        try:
+            yield
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                profiler.create_stats()
+                with self._lock:
+                    if self._profiler is session:
+                        self._thread_stats[ident] = profiler.stats
+
+    def _write_profile(self, filename):
+        """Writes the session's stats merged with those copied from other threads (this pauses the profiler)."""
+        stats = pstats.Stats(self._profiler)
+        with self._lock:
+            copies = list(self._thread_stats.values())
+        for copy in copies:
+            stats.add(_CopiedStats(copy))
+        stats.dump_stats(filename)
+
+    def dump_profile(self, filename='profile.prof') -> bool:
+        """Writes the cProfile stats gathered so far and keeps profiling."""
+        if self._profiler is None:
+            return False
+        self._write_profile(filename)
+        self._profiler.enable()
+        return True
+
+    def stop_profile(self, filename='profile.prof') -> bool:
+        """Stops the cProfile session and writes its stats (readable with ``pstats``/snakeviz)."""
+        if self._profiler is None:
+            return False
+        self._profiler.disable()
+        self._write_profile(filename)
+        self._profiler = None
+        return True
+
+
+class _CopiedStats:
+    """Profile stats copied on another thread, in the form ``pstats.Stats`` loads."""
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+# Shared by every layer; set PATHFINDER_PROFILE=1 to record from start-up
+PROFILER = Instrumentation(enabled=os.environ.get('PATHFINDER_PROFILE') == '1')
+instrument = PROFILER.instrument
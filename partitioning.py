@@ -0,0 +1,410 @@
+# file: partitioning.py
+
+import argparse
+import json
+import math
+import os
+import sqlite3
+import time
+
+import numpy as np
+
+from csr_graph import CSRGraph, SearchResult
+from database_manager import DatabaseManager
+from graph_manager import GraphManager
+from route_cache import LRUCache
+
+OVERLAY_FORMAT_VERSION = 1
+OVERLAY_FILE = 'overlay.db'
+CUT = -1  # partition recorded for overlay arcs that are roads between two partitions
+
+
+def partition_dir_for(db_name: str) -> str | None:
+    """Returns the directory holding a database's shards and overlay (None for in-memory DBs)."""
+    if not db_name or db_name == ':memory:':
+        return None
+    return os.path.splitext(db_name)[0] + '.parts'
+
+
+def grid_splits(xs, ys, cols: int, rows: int) -> tuple:
+    """Cuts the map into ``cols`` x-bands, then each band into ``rows`` cells.
+
+    Cuts are placed at coordinate quantiles, so cells hold about the same
+    number of locations. Returns ``(x_splits, y_splits)``, where
+    ``y_splits[c]`` holds the row boundaries of band ``c``.
+    """
+    x_splits = np.quantile(xs, np.linspace(0, 1, cols + 1)[1:-1]) if len(xs) else np.zeros(cols - 1)
+    band = np.searchsorted(x_splits, xs, side='right')
+    y_splits = np.zeros((cols, rows - 1))
+    for c in range(cols):
+        in_band = ys[band == c]
+        if len(in_band):
+            y_splits[c] = np.quantile(in_band, np.linspace(0, 1, rows + 1)[1:-1])
+    return x_splits, y_splits
+
+
+def assign_cells(xs, ys, x_splits, y_splits) -> np.ndarray:
+    """Returns the partition (band * rows + row) of every coordinate pair."""
+    band = np.searchsorted(x_splits, xs, side='right')
+    cells = np.empty(len(xs), dtype=np.int64)
+    for c, splits in enumerate(y_splits):
+        mask = band == c
+        cells[mask] = c * (len(splits) + 1) + np.searchsorted(splits, ys[mask], side='right')
+    return cells
+
+
+def _arc_weight(csr: CSRGraph, u: int, v: int) -> float:
+    return float(min(csr.weights[i] for i in csr.arc_positions(u, v)))
+
+
+def _fetch_in_chunks(cursor, sql, size=50000):
+    cursor.execute(sql)
+    while rows := cursor.fetchmany(size):
+        yield rows
+
+
+def build_partitions(db_manager: DatabaseManager, cols=4, rows=4, directory=None, batch_size=50000) -> dict:
+    """Splits a map database into coordinate-region shards plus a boundary overlay.
+
+    Each shard is an ordinary map database holding one cell's locations and
+    the roads inside it. Roads between cells are cut edges and go to the
+    overlay, together with boundary cliques: for every cell, the shortest
+    route inside the cell between each pair of its boundary locations,
+    stored with the full path so it can be unpacked. A clique arc whose path
+    passes another boundary location of the cell is left out, since the two
+    shorter arcs already cover it. Locations and roads are streamed, so
+    memory use is bounded by the largest cell. Returns build statistics.
+    """
+    started = time.perf_counter()
+    directory = directory or partition_dir_for(db_manager.db_name)
+    if directory is None:
+        raise ValueError("Partitioning needs a file-backed database or an explicit directory.")
+    os.makedirs(directory, exist_ok=True)
+    for name in os.listdir(directory):
+        if name.startswith('part_') or name.startswith(OVERLAY_FILE):
+            os.remove(os.path.join(directory, name))
+    cursor = db_manager.conn.cursor()
+
+    # Pass 1: coordinates only, to place the cuts
+    chunks = list(_fetch_in_chunks(cursor, "SELECT id, x, y FROM locations ORDER BY id", batch_size))
+    table = np.array([row for chunk in chunks for row in chunk], dtype=np.float64).reshape(-1, 3)
+    del chunks
+    ids = table[:, 0].astype(np.int64)
+    x_splits, y_splits = grid_splits(table[:, 1], table[:, 2], cols, rows)
+    cells = assign_cells(table[:, 1], table[:, 2], x_splits, y_splits)
+    del table
+
+    overlay_temp = os.path.join(directory, OVERLAY_FILE + '.tmp')
+    overlay = sqlite3.connect(overlay_temp)
+    _create_overlay_tables(overlay)
+    shard_files = [f"part_{p // rows}_{p % rows}.db" for p in range(cols * rows)]
+    shards = [DatabaseManager(os.path.join(directory, f)) for f in shard_files]
+
+    # Pass 2: locations go to their shard, keeping their IDs so roads need no name lookups
+    for chunk in _fetch_in_chunks(cursor, "SELECT id, name, x, y FROM locations ORDER BY id", batch_size):
+        chunk_cells = cells[np.searchsorted(ids, [row[0] for row in chunk])].tolist()
+        for p in set(chunk_cells):
+            shards[p].cursor.executemany("INSERT INTO locations (id, name, x, y) VALUES (?, ?, ?, ?)",
+                                         [row for row, c in zip(chunk, chunk_cells) if c == p])
+        overlay.executemany("INSERT INTO node_partition (name, partition) VALUES (?, ?)",
+                            [(row[1], c) for row, c in zip(chunk, chunk_cells)])
+
+    # Pass 3: roads inside a cell go to its shard; the rest are cut into (start, end) arcs, where
+    # a later road replaces an earlier one in the directions it covers
+    cut = {}
+    for chunk in _fetch_in_chunks(
+            cursor, "SELECT start_location_id, end_location_id, weight, one_way FROM roads ORDER BY id", batch_size):
+        road_ids = np.array([row[:2] for row in chunk], dtype=np.int64).reshape(-1, 2)
+        pos = np.minimum(np.searchsorted(ids, road_ids), max(len(ids) - 1, 0))
+        valid = (ids[pos] == road_ids).all(axis=1) if len(ids) else np.zeros(len(chunk), dtype=bool)
+        start_cells, end_cells = cells[pos[:, 0]].tolist(), cells[pos[:, 1]].tolist()
+        inside = {}
+        for row, ok, a, b in zip(chunk, valid.tolist(), start_cells, end_cells):
+            if not ok:
+                continue
+            if a == b:
+                inside.setdefault(a, []).append(row)
+            else:
+                cut[row[0], row[1]] = row[2]
+                if not row[3]:
+                    cut[row[1], row[0]] = row[2]
+        for p, roads in inside.items():
+            shards[p].cursor.executemany(
+                "INSERT INTO roads (start_location_id, end_location_id, weight, one_way) VALUES (?, ?, ?, ?)", roads)
+    for shard in shards:
+        shard.conn.commit()
+
+    # Boundary locations: the ends of cut edges
+    boundary_ids = sorted({i for arc in cut for i in arc})
+    boundary = {}
+    for i in range(0, len(boundary_ids), 500):
+        chunk = boundary_ids[i:i + 500]
+        cursor.execute(f"SELECT id, name, x, y FROM locations WHERE id IN ({','.join('?' * len(chunk))})", chunk)
+        boundary.update((row[0], row[1:]) for row in cursor.fetchall())
+    cell_of = dict(zip(boundary_ids, cells[np.searchsorted(ids, boundary_ids)].tolist())) if boundary_ids else {}
+    overlay.executemany("INSERT INTO boundary (name, partition, x, y) VALUES (?, ?, ?, ?)",
+                        [(name, cell_of[i], x, y) for i, (name, x, y) in boundary.items()])
+    arcs = [(boundary[start][0], boundary[end][0], weight, CUT) for (start, end), weight in cut.items()]
+    overlay.executemany("INSERT INTO overlay_arcs (source, target, weight, partition) VALUES (?, ?, ?, ?)", arcs)
+
+    # Boundary cliques, one cell at a time
+    clique_arcs = 0
+    partition_rows = []
+    for p, shard in enumerate(shards):
+        csr = GraphManager._csr_from_tables(shard.get_location_table(), shard.get_road_ids())
+        names = [boundary[i][0] for i in boundary_ids if cell_of[i] == p]
+        clique_arcs += _write_clique(overlay, csr, p, names)
+        c, r = divmod(p, rows)
+        x_bounds = [-math.inf, *x_splits.tolist(), math.inf][c:c + 2]
+        y_bounds = [-math.inf, *y_splits[c].tolist(), math.inf][r:r + 2]
+        partition_rows.append((p, shard_files[p], *x_bounds, *y_bounds, csr.num_nodes, len(names)))
+        shard.close()
+    overlay.executemany("INSERT INTO partitions (id, file, xmin, xmax, ymin, ymax, nodes, boundary) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", partition_rows)
+    meta = {'format': OVERLAY_FORMAT_VERSION, 'version': db_manager.get_change_version(), 'cols': cols, 'rows': rows}
+    overlay.executemany("INSERT INTO meta (key, value) VALUES (?, ?)", [(k, json.dumps(v)) for k, v in meta.items()])
+    overlay.commit()
+    overlay.close()
+    os.replace(overlay_temp, os.path.join(directory, OVERLAY_FILE))
+    return {'partitions': cols * rows, 'locations': len(ids), 'cut_roads': len({frozenset(arc) for arc in cut}), 'boundary': len(boundary_ids),
+            'clique_arcs': clique_arcs, 'largest_partition': max((row[6] for row in partition_rows), default=0),
+            'seconds': time.perf_counter() - started}
+
+
+def _create_overlay_tables(conn):
+    conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+    conn.execute('''
+        CREATE TABLE partitions (
+            id INTEGER PRIMARY KEY, file TEXT NOT NULL,
+            xmin REAL, xmax REAL, ymin REAL, ymax REAL, nodes INTEGER, boundary INTEGER
+        )
+    ''')
+    conn.execute("CREATE TABLE node_partition (name TEXT PRIMARY KEY, partition INTEGER NOT NULL)")
+    conn.execute("CREATE TABLE boundary (name TEXT PRIMARY KEY, partition INTEGER NOT NULL, x REAL, y REAL)")
+    conn.execute('''
+        CREATE TABLE overlay_arcs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            source TEXT NOT NULL, target TEXT NOT NULL, weight REAL NOT NULL, partition INTEGER NOT NULL
+        )
+    ''')
+    conn.execute("CREATE INDEX idx_overlay_arcs_ends ON overlay_arcs(source, target)")
+    # Clique arcs only: the locations and road weights the arc stands for
+    conn.execute("CREATE TABLE arc_paths (arc_id INTEGER PRIMARY KEY, path TEXT NOT NULL, weights TEXT NOT NULL)")
+
+
+def _write_clique(overlay, csr: CSRGraph, partition: int, names: list, chunk_size=64) -> int:
+    """Writes the in-cell shortest routes between a cell's boundary locations; returns the arcs written."""
+    nodes = [csr.index[name] for name in names]
+    boundary = set(nodes)
+    written = 0
+    for i in range(0, len(nodes), chunk_size):
+        sources = nodes[i:i + chunk_size]
+        costs, preds = csr.many_to_many(sources, nodes, return_predecessors=True)
+        for row, source in enumerate(sources):
+            for col, target in enumerate(nodes):
+                if source == target or not np.isfinite(costs[row, col]):
+                    continue
+                path = CSRGraph.tree_path(preds[row], source, target)
+                if boundary.intersection(path[1:-1]):
+                    continue
+                weights = [_arc_weight(csr, u, v) for u, v in zip(path, path[1:])]
+                arc = overlay.execute(
+                    "INSERT INTO overlay_arcs (source, target, weight, partition) VALUES (?, ?, ?, ?)",
+                    (csr.names[source], csr.names[target], float(costs[row, col]), partition))
+                overlay.execute("INSERT INTO arc_paths (arc_id, path, weights) VALUES (?, ?, ?)",
+                                (arc.lastrowid, json.dumps([csr.names[n] for n in path]), json.dumps(weights)))
+                written += 1
+    return written
+
+
+class PartitionedRouter:
+    """Answers shortest-path queries from partition shards plus the boundary overlay.
+
+    Only the overlay stays in memory: the boundary locations and the cut and
+    clique arcs between them. A query loads the start and end partitions on
+    demand and joins them to the overlay. Every route leaves a partition
+    through its boundary, and the clique arcs are the shortest way across
+    each other partition, so the answer costs the same as on the full map.
+    Loaded partitions and joined query graphs are kept in small LRU caches,
+    so memory stays bounded by a few partitions.
+    """
+
+    def __init__(self, directory: str, cache_size=4):
+        self.directory = directory
+        self.conn = sqlite3.connect(os.path.join(directory, OVERLAY_FILE))
+        meta = {k: json.loads(v) for k, v in self.conn.execute("SELECT key, value FROM meta")}
+        if meta.get('format') != OVERLAY_FORMAT_VERSION:
+            raise ValueError(f"'{directory}' does not hold a supported partition overlay.")
+        self.version = meta['version']
+        self.files = dict(self.conn.execute("SELECT id, file FROM partitions"))
+
+        rows = self.conn.execute("SELECT name, partition, x, y FROM boundary ORDER BY rowid").fetchall()
+        self.boundary_names = [row[0] for row in rows]
+        self.boundary_index = {name: i for i, name in enumerate(self.boundary_names)}
+        self.boundary_partition = np.array([row[1] for row in rows], dtype=np.int64)
+        self.boundary_xs = np.array([row[2] for row in rows], dtype=np.float64)
+        self.boundary_ys = np.array([row[3] for row in rows], dtype=np.float64)
+        arcs = self.conn.execute("SELECT source, target, weight, partition FROM overlay_arcs ORDER BY id").fetchall()
+        self.arc_sources = np.array([self.boundary_index[a[0]] for a in arcs], dtype=np.int64)
+        self.arc_targets = np.array([self.boundary_index[a[1]] for a in arcs], dtype=np.int64)
+        self.arc_weights = np.array([a[2] for a in arcs], dtype=np.float64)
+        self.arc_partitions = np.array([a[3] for a in arcs], dtype=np.int64)
+
+        self._partitions = LRUCache(cache_size)
+        self._query_graphs = LRUCache(cache_size)
+        self.partition_loads = 0
+
+    def is_current(self, db_manager: DatabaseManager) -> bool:
+        """Whether the shards were built from the database's current contents."""
+        return self.version == db_manager.get_change_version()
+
+    def partition_of(self, name: str) -> int | None:
+        """Returns the partition holding a location, or None if there is no such location."""
+        row = self.conn.execute("SELECT partition FROM node_partition WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def load_partition(self, partition: int) -> CSRGraph:
+        """Returns one partition's CSR graph, reading its shard on first use."""
+        csr = self._partitions.get(partition)
+        if csr is None:
+            shard = DatabaseManager(os.path.join(self.directory, self.files[partition]))
+            try:
+                csr = GraphManager._csr_from_tables(shard.get_location_table(), shard.get_road_ids())
+            finally:
+                shard.close()
+            self._partitions.put(partition, csr)
+            self.partition_loads += 1
+        return csr
+
+    def _query_graph(self, start_partition: int, end_partition: int) -> tuple:
+        """Joins the start and end partitions to the overlay.
+
+        Returns the directed CSR graph and, for every node outside the two
+        partitions, the partition its clique arcs cross (-1 for the rest).
+        """
+        key = (start_partition, end_partition)
+        cached = self._query_graphs.get(key)
+        if cached is not None:
+            return cached
+        parts = [start_partition] if start_partition == end_partition else [start_partition, end_partition]
+        graphs = [self.load_partition(p) for p in parts]
+        names, xs, ys, sources, targets, weights = [], [], [], [], [], []
+        to_query = np.full(len(self.boundary_names), -1, dtype=np.int64)
+        offset = 0
+        for p, csr in zip(parts, graphs):
+            names.extend(csr.names)
+            xs.append(csr.xs)
+            ys.append(csr.ys)
+            sources.append(csr.arc_sources() + offset)
+            targets.append(csr.indices + offset)
+            weights.append(csr.weights)
+            inside = np.flatnonzero(self.boundary_partition == p)
+            to_query[inside] = [offset + csr.index[self.boundary_names[i]] for i in inside.tolist()]
+            offset += csr.num_nodes
+        local = offset
+        outside = np.flatnonzero(to_query < 0)
+        to_query[outside] = np.arange(local, local + len(outside))
+        names.extend(self.boundary_names[i] for i in outside.tolist())
+        xs.append(self.boundary_xs[outside])
+        ys.append(self.boundary_ys[outside])
+        # The loaded partitions' own clique arcs are redundant with their roads
+        keep = ~np.isin(self.arc_partitions, parts)
+        sources.append(to_query[self.arc_sources[keep]])
+        targets.append(to_query[self.arc_targets[keep]])
+        weights.append(self.arc_weights[keep])
+        csr = CSRGraph.from_edge_arrays(names, np.concatenate(sources), np.concatenate(targets),
+                                        np.concatenate(weights), np.concatenate(xs), np.concatenate(ys), directed=True)
+        crossed = np.full(csr.num_nodes, -1, dtype=np.int64)
+        crossed[local:] = self.boundary_partition[outside]
+        self._query_graphs.put(key, (csr, crossed))
+        return csr, crossed
+
+    def shortest_path(self, start_name: str, end_name: str, method='dijkstra') -> SearchResult | None:
+        """Finds the shortest route between two location names.
+
+        Returns None if either location is unknown; the result's ``path`` is
+        a list of names, or None when they are not connected. Clique arcs in
+        the route are unpacked into the roads they stand for. The cost is
+        summed road by road from the start, so it matches an unpartitioned
+        search exactly; where several routes tie, either may be returned.
+        """
+        start_partition, end_partition = self.partition_of(start_name), self.partition_of(end_name)
+        if start_partition is None or end_partition is None:
+            return None
+        if start_name == end_name:
+            return SearchResult([start_name], 0.0, 1)
+        csr, crossed = self._query_graph(start_partition, end_partition)
+        result = csr.search(csr.index[start_name], csr.index[end_name], 'dijkstra' if method == 'ch' else method)
+        if result.path is None:
+            return result
+        path, weights = [csr.names[result.path[0]]], []
+        for u, v in zip(result.path, result.path[1:]):
+            if crossed[u] >= 0 and crossed[u] == crossed[v]:
+                # A clique arc: the route across a partition that is not loaded
+                part_path, part_weights = self._unpack(csr.names[u], csr.names[v], int(crossed[u]))
+                path.extend(part_path[1:])
+                weights.extend(part_weights)
+            else:
+                path.append(csr.names[v])
+                weights.append(_arc_weight(csr, u, v))
+        cost = 0.0
+        for w in weights:
+            cost += w
+        return SearchResult(path, cost, result.settled)
+
+    def _unpack(self, source: str, target: str, partition: int) -> tuple[list, list]:
+        row = self.conn.execute('''
+            SELECT p.path, p.weights FROM overlay_arcs a JOIN arc_paths p ON p.arc_id = a.id
+            WHERE a.source = ? AND a.target = ? AND a.partition = ?
+        ''', (source, target, partition)).fetchone()
+        return json.loads(row[0]), json.loads(row[1])
+
+    def close(self):
+        self.conn.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Splits a map database into region shards and routes across them.")
+    parser.add_argument('--db', default='city_map.db', help="SQLite database file")
+    parser.add_argument('--dir', help="shard directory (default: <db name>.parts)")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build = subparsers.add_parser('build', help="(re)build the shards and the boundary overlay")
+    build.add_argument('--cols', type=int, default=4)
+    build.add_argument('--rows', type=int, default=4)
+    route = subparsers.add_parser('route', help="route between two locations using the shards")
+    route.add_argument('start')
+    route.add_argument('end')
+    route.add_argument('--method', choices=GraphManager.METHODS, default='dijkstra')
+    args = parser.parse_args(argv)
+    directory = args.dir or partition_dir_for(args.db)
+
+    if args.command == 'build':
+        db_manager = DatabaseManager(args.db)
+        try:
+            stats = build_partitions(db_manager, args.cols, args.rows, directory)
+        finally:
+            db_manager.close()
+        print(json.dumps(stats, indent=2))
+        return
+    router = PartitionedRouter(directory)
+    db_manager = DatabaseManager(args.db)
+    try:
+        current = router.is_current(db_manager)
+    finally:
+        db_manager.close()
+    if not current:
+        print(f"Error: the shards in '{directory}' are out of date; rebuild them with 'build'.")
+        router.close()
+        return
+    graph_manager = GraphManager(backend='csr')
+    graph_manager.use_partitions(router)
+    route = graph_manager.find_route(args.start, args.end, args.method)
+    if route is None:
+        print(f"No path found between {args.start} and {args.end}.")
+    else:
+        print(f"{' -> '.join(route[0])} (cost {route[1]:g}; {router.partition_loads} partition(s) loaded)")
+    router.close()
+
+
+if __name__ == '__main__':
+    main()
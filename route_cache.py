@@ -0,0 +1,70 @@
+# file: route_cache.py
+
+from collections import OrderedDict
+
+
+class LRUCache:
+    """A bounded mapping that evicts the least recently used entry when full."""
+
+    def __init__(self, maxsize=1024):
+        """Initializes an empty cache holding at most ``maxsize`` entries."""
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        """Returns the cached value and marks it as recently used, counting the hit or miss."""
+        try:
+            value = self._data[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def peek(self, key, default=None):
+        """Returns the cached value without touching the LRU order or the counters."""
+        return self._data.get(key, default)
+
+    def put(self, key, value):
+        """Stores a value, evicting the least recently used entry if the cache is full."""
+        if self.maxsize <= 0:
+            return
+        self._data[key] = value
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key, default=None):
+        """Removes an entry and returns its value."""
+        return self._data.pop(key, default)
+
+    def items(self):
+        """Returns a snapshot of the cached (key, value) pairs, oldest first."""
+        return list(self._data.items())
+
+    def clear(self):
+        """Drops every entry; the counters are kept so they describe the whole session."""
+        self._data.clear()
+
+    def stats(self) -> dict:
+        """Returns the size and hit/miss/eviction counters."""
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
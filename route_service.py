@@ -0,0 +1,309 @@
+# file: route_service.py
+
+import argparse
+import asyncio
+import json
+import queue
+import sqlite3
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from urllib.parse import parse_qs, urlsplit, unquote
+
+from database_manager import DatabaseManager
+from graph_manager import GraphManager
+
+
+class ReadConnectionPool:
+    """A fixed pool of read-only SQLite connections shared between threads."""
+
+    def __init__(self, db_name: str, size=4):
+        """Opens ``size`` read-only connections to ``db_name``."""
+        self._pool = queue.Queue()
+        for _ in range(size):
+            conn = sqlite3.connect(f"file:{db_name}?mode=ro", uri=True, check_same_thread=False)
+            self._pool.put(conn)
+        self.size = size
+
+    @contextmanager
+    def connection(self):
+        """Borrows a connection for the duration of a ``with`` block."""
+        conn = self._pool.get()
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    def close(self):
+        """Closes every pooled connection."""
+        for _ in range(self.size):
+            self._pool.get().close()
+
+
+class LatencyRecorder:
+    """Keeps the most recent request latencies per endpoint and reports percentiles."""
+
+    PERCENTILES = (50, 90, 95, 99)
+
+    def __init__(self, window=10000):
+        """Keeps at most ``window`` samples per endpoint."""
+        self._samples = defaultdict(lambda: deque(maxlen=window))
+        self._counts = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def record(self, endpoint: str, seconds: float):
+        with self._lock:
+            self._samples[endpoint].append(seconds)
+            self._counts[endpoint] += 1
+
+    def summary(self) -> dict:
+        """Returns the request count and latency percentiles (in ms) per endpoint."""
+        with self._lock:
+            snapshot = {endpoint: sorted(samples) for endpoint, samples in self._samples.items()}
+            counts = dict(self._counts)
+        report = {}
+        for endpoint, samples in snapshot.items():
+            stats = {'count': counts[endpoint]}
+            for p in self.PERCENTILES:
+                rank = min(len(samples) - 1, int(round(p / 100 * (len(samples) - 1))))
+                stats[f'p{p}_ms'] = samples[rank] * 1000
+            stats['max_ms'] = samples[-1] * 1000
+            report[endpoint] = stats
+        return report
+
+
+class HTTPError(Exception):
+    """An error that is reported to the client with the given HTTP status."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class RouteService:
+    """A headless HTTP/JSON service answering shortest-path queries.
+
+    The graph is loaded once. Route queries run on a thread pool, so a slow
+    search does not block the event loop or other endpoints, but they are
+    answered one at a time under ``graph_lock``: ``GraphManager``'s route and
+    tree caches and its lazily built indexes are not thread-safe, and the
+    searches are pure Python held by the GIL anyway. Location lookups go
+    through a pool of read-only SQLite connections and do run concurrently.
+    All edits are funnelled through a single writer thread that owns the only
+    read-write ``DatabaseManager``.
+
+    Endpoints:
+        GET    /route?start=A&end=B[&method=astar]
+        GET    /locations/<name>
+        POST   /locations        {"name": ..., "x": ..., "y": ...}
+        POST   /locations/move   {"name": ..., "x": ..., "y": ...}
+        DELETE /locations/<name>
+        POST   /roads            {"start": ..., "end": ..., "weight": ..., "one_way": false}
+        POST   /roads/weights    {"updates": [{"start": ..., "end": ..., "weight": ...}, ...]}
+        GET    /stats
+    """
+
+    def __init__(self, db_name='city_map.db', readers=4, query_threads=4, backend='csr'):
+        self.db_name = db_name
+        self.graph_manager = GraphManager(backend=backend)
+        self.graph_lock = threading.Lock()
+        self.latency = LatencyRecorder()
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='db-writer')
+        self._queries = ThreadPoolExecutor(max_workers=query_threads, thread_name_prefix='route-query')
+        self._db_manager = None
+        # The writer connection is created on the writer thread, which then owns it
+        self._writer.submit(self._open_writer).result()
+        self.readers = ReadConnectionPool(db_name, readers)
+
+    def _open_writer(self):
+        self._db_manager = DatabaseManager(self.db_name)
+        self.graph_manager.load_graph(self._db_manager)
+
+    def close(self):
+        """Stops the worker threads and closes every connection."""
+        self._queries.shutdown()
+        self._writer.submit(self._db_manager.close).result()
+        self._writer.shutdown()
+        self.readers.close()
+
+    # --- Request handlers (run on worker threads) ---
+
+    def _route(self, start, end, method):
+        with self.graph_lock:
+            route = self.graph_manager.find_route(start, end, method)
+        if route is None:
+            raise HTTPError(404, f"No path found between {start} and {end}.")
+        return {'path': route[0], 'cost': route[1]}
+
+    def _lookup_location(self, name):
+        with self.readers.connection() as conn:
+            row = conn.execute("SELECT name, x, y FROM locations WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            raise HTTPError(404, f"Location '{name}' not found.")
+        return {'name': row[0], 'x': row[1], 'y': row[2]}
+
+    def _edit(self, db_write, graph_delta, message):
+        """Runs on the writer thread: applies a DB write, then mirrors it in the graph."""
+        if not db_write(self._db_manager):
+            raise HTTPError(409, message)
+        with self.graph_lock:
+            graph_delta(self.graph_manager)
+            self.graph_manager.sync_with_db(self._db_manager)
+        return {'ok': True, 'version': self.graph_manager.version}
+
+    def _stats(self):
+        """Reports latencies, cache counters and the graph size from the CSR arrays.
+
+        ``arcs`` counts directed arcs, so a two-way road counts twice; the
+        NetworkX graph is never built just to count its edges.
+        """
+        with self.graph_lock:
+            caches = self.graph_manager.get_cache_stats()
+            csr = self.graph_manager.get_csr_graph()
+            nodes, arcs = len(csr.names), int(csr.indices.size)
+        return {'latency': self.latency.summary(), 'caches': caches, 'nodes': nodes, 'arcs': arcs}
+
+    async def dispatch(self, method: str, path: str, query: dict, body: dict):
+        """Routes one request to its handler and returns the JSON-serialisable result."""
+        loop = asyncio.get_running_loop()
+        parts = [unquote(p) for p in path.strip('/').split('/') if p]
+
+        def arg(source, key, convert=str):
+            if key not in source:
+                raise HTTPError(400, f"Missing parameter '{key}'.")
+            try:
+                return convert(source[key])
+            except (TypeError, ValueError):
+                raise HTTPError(400, f"Invalid value for '{key}'.")
+
+        if method == 'GET' and parts == ['route']:
+            start, end = arg(query, 'start'), arg(query, 'end')
+            search = query.get('method', 'dijkstra')
+            if search not in GraphManager.METHODS:
+                raise HTTPError(400, f"Unknown search method '{search}'.")
+            return await loop.run_in_executor(self._queries, self._route, start, end, search)
+        if method == 'GET' and parts == ['stats']:
+            # It waits for graph_lock, so it must not block the event loop behind a slow search
+            return await loop.run_in_executor(self._queries, self._stats)
+        if method == 'GET' and len(parts) == 2 and parts[0] == 'locations':
+            return await loop.run_in_executor(self._queries, self._lookup_location, parts[1])
+
+        if method == 'POST' and parts == ['locations']:
+            name, x, y = arg(body, 'name'), arg(body, 'x', int), arg(body, 'y', int)
+            edit = (lambda db: db.add_location(name, x, y), lambda gm: gm.add_node(name, x, y),
+                    f"Location '{name}' could not be added.")
+        elif method == 'POST' and parts == ['locations', 'move']:
+            name, x, y = arg(body, 'name'), arg(body, 'x', int), arg(body, 'y', int)
+            edit = (lambda db: db.update_location_coords(name, x, y), lambda gm: gm.move_node(name, x, y),
+                    f"Location '{name}' could not be moved.")
+        elif method == 'DELETE' and len(parts) == 2 and parts[0] == 'locations':
+            name = parts[1]
+            edit = (lambda db: db.delete_location(name), lambda gm: gm.remove_node(name),
+                    f"Location '{name}' could not be deleted.")
+        elif method == 'POST' and parts == ['roads']:
+            start, end, weight = arg(body, 'start'), arg(body, 'end'), arg(body, 'weight', float)
+            one_way = bool(body.get('one_way', False))
+            edit = (lambda db: db.add_road(start, end, weight, one_way), lambda gm: gm.add_edge(start, end, weight, one_way),
+                    "Could not add the road.")
+        elif method == 'POST' and parts == ['roads', 'weights']:
+            # A traffic tick: one transaction, and cached trees are repaired rather than rebuilt
+            updates = arg(body, 'updates', list)
+            try:
+                updates = [(u['start'], u['end'], float(u['weight'])) for u in updates]
+            except (KeyError, TypeError, ValueError):
+                raise HTTPError(400, "Each update needs 'start', 'end' and a numeric 'weight'.")
+            edit = (lambda db: db.update_road_weights(updates), lambda gm: gm.update_road_weights(updates),
+                    "No road weights were changed.")
+        else:
+            raise HTTPError(404, f"No endpoint for {method} {path}.")
+        return await loop.run_in_executor(self._writer, self._edit, *edit)
+
+    # --- HTTP plumbing ---
+
+    async def handle_connection(self, reader, writer):
+        """Serves HTTP/1.1 requests on one keep-alive connection."""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, target, _ = request_line.decode('latin-1').split(' ', 2)
+                except ValueError:
+                    await self._respond(writer, 400, {'error': 'Malformed request line.'}, False)
+                    break
+                headers = {}
+                while (line := await reader.readline()) not in (b'\r\n', b'\n', b''):
+                    key, _, value = line.decode('latin-1').partition(':')
+                    headers[key.strip().lower()] = value.strip()
+                raw_body = await reader.readexactly(int(headers.get('content-length', 0) or 0))
+                keep_alive = headers.get('connection', '').lower() != 'close'
+
+                started = time.perf_counter()
+                url = urlsplit(target)
+                endpoint = f"{method} /{url.path.strip('/').split('/')[0]}"
+                try:
+                    query = {k: v[0] for k, v in parse_qs(url.query).items()}
+                    body = json.loads(raw_body) if raw_body else {}
+                    if not isinstance(body, dict):
+                        raise HTTPError(400, "Request body must be a JSON object.")
+                    status, payload = 200, await self.dispatch(method.upper(), url.path, query, body)
+                except HTTPError as e:
+                    status, payload = e.status, {'error': str(e)}
+                except json.JSONDecodeError:
+                    status, payload = 400, {'error': 'Request body is not valid JSON.'}
+                except Exception as e:
+                    status, payload = 500, {'error': f"{type(e).__name__}: {e}"}
+                self.latency.record(endpoint, time.perf_counter() - started)
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _respond(writer, status, payload, keep_alive):
+        reasons = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 409: 'Conflict', 500: 'Internal Server Error'}
+        body = json.dumps(payload).encode()
+        head = (f"HTTP/1.1 {status} {reasons.get(status, '')}\r\n"
+                f"Content-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode('latin-1') + body)
+        await writer.drain()
+
+    async def serve(self, host='127.0.0.1', port=8080):
+        """Accepts connections until cancelled."""
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        addresses = ', '.join(str(sock.getsockname()) for sock in server.sockets)
+        print(f"Route service listening on {addresses}")
+        async with server:
+            await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless shortest-path service for the city map.")
+    parser.add_argument('--db', default='city_map.db', help="SQLite database file")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--readers', type=int, default=4, help="read-only SQLite connections in the pool")
+    parser.add_argument('--query-threads', type=int, default=4, help="threads taking route queries off the event loop (searches run one at a time)")
+    parser.add_argument('--backend', choices=GraphManager.BACKENDS, default='csr')
+    args = parser.parse_args(argv)
+
+    service = RouteService(args.db, args.readers, args.query_threads, args.backend)
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(json.dumps(service.latency.summary(), indent=2))
+        service.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+# file: spatial_index.py
+
+import math
+
+
+class SpatialGrid:
+    """A uniform hash grid over node coordinates.
+
+    Each node is filed under the square cell containing it, so inserts,
+    moves and deletes are O(1), a rectangle query only visits the cells it
+    overlaps, and a nearest-node query only scans rings of cells around the
+    query point until no closer node can exist.
+    """
+
+    def __init__(self, cell_size=50.0):
+        """Initializes an empty grid with square cells of ``cell_size`` map units."""
+        self.cell_size = float(cell_size)
+        self._cells = {}
+        self._positions = {}
+
+    @classmethod
+    def from_positions(cls, positions: dict, nodes_per_cell=2) -> 'SpatialGrid':
+        """Builds a grid sized so each cell holds about ``nodes_per_cell`` nodes."""
+        cell_size = 50.0
+        if len(positions) > 1:
+            xs = [p[0] for p in positions.values()]
+            ys = [p[1] for p in positions.values()]
+            area = max(max(xs) - min(xs), 1) * max(max(ys) - min(ys), 1)
+            cell_size = math.sqrt(area * nodes_per_cell / len(positions))
+        grid = cls(cell_size)
+        for node, (x, y) in positions.items():
+            grid.insert(node, x, y)
+        return grid
+
+    def __len__(self):
+        return len(self._positions)
+
+    def __contains__(self, node):
+        return node in self._positions
+
+    def _cell(self, x, y):
+        return (math.floor(x / self.cell_size), math.floor(y / self.cell_size))
+
+    def insert(self, node, x, y):
+        """Adds a node (or moves it if it is already indexed)."""
+        if node in self._positions:
+            self.remove(node)
+        self._positions[node] = (x, y)
+        self._cells.setdefault(self._cell(x, y), set()).add(node)
+
+    def remove(self, node):
+        """Removes a node; unknown nodes are ignored."""
+        pos = self._positions.pop(node, None)
+        if pos is None:
+            return
+        cell = self._cell(*pos)
+        members = self._cells[cell]
+        members.discard(node)
+        if not members:
+            del self._cells[cell]
+
+    def move(self, node, x, y):
+        """Updates a node's position."""
+        self.insert(node, x, y)
+
+    def query_rect(self, xmin, xmax, ymin, ymax) -> list:
+        """Returns the nodes whose positions lie inside the rectangle."""
+        cx0, cy0 = self._cell(xmin, ymin)
+        cx1, cy1 = self._cell(xmax, ymax)
+        if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) > len(self._cells):
+            # The rectangle spans more cells than are occupied: scan the occupied ones
+            cells = (members for (cx, cy), members in self._cells.items()
+                     if cx0 <= cx <= cx1 and cy0 <= cy <= cy1)
+        else:
+            cells = (self._cells[(cx, cy)] for cx in range(cx0, cx1 + 1)
+                     for cy in range(cy0, cy1 + 1) if (cx, cy) in self._cells)
+        found = []
+        for members in cells:
+            for node in members:
+                x, y = self._positions[node]
+                if xmin <= x <= xmax and ymin <= y <= ymax:
+                    found.append(node)
+        return found
+
+    def nearest(self, x, y, max_dist=math.inf):
+        """Returns ``(node, distance)`` for the closest node within ``max_dist``, or ``(None, inf)``."""
+        if not self._positions:
+            return None, math.inf
+        cx, cy = self._cell(x, y)
+        best, best_dist = None, math.inf
+        # Rings beyond this radius cannot hold anything within max_dist
+        max_ring = math.inf if math.isinf(max_dist) else int(max_dist / self.cell_size) + 1
+        ring = 0
+        while ring <= max_ring:
+            for cell in self._ring_cells(cx, cy, ring):
+                for node in self._cells.get(cell, ()):
+                    nx_, ny_ = self._positions[node]
+                    dist = math.hypot(nx_ - x, ny_ - y)
+                    if dist < best_dist:
+                        best, best_dist = node, dist
+            # Every unvisited cell is at least ring * cell_size away from the query point
+            if best is not None and best_dist <= ring * self.cell_size:
+                break
+            if ring * self.cell_size > max_dist:
+                break
+            ring += 1
+            if 8 * ring > len(self._cells):
+                # Far from all data: scanning every node is cheaper than more empty rings
+                for node, (nx_, ny_) in self._positions.items():
+                    dist = math.hypot(nx_ - x, ny_ - y)
+                    if dist < best_dist:
+                        best, best_dist = node, dist
+                break
+        if best_dist > max_dist:
+            return None, math.inf
+        return best, best_dist
+
+    @staticmethod
+    def _ring_cells(cx, cy, ring):
+        """Yields the cells at Chebyshev distance ``ring`` from ``(cx, cy)``."""
+        if ring == 0:
+            yield (cx, cy)
+            return
+        for dx in range(-ring, ring + 1):
+            yield (cx + dx, cy - ring)
+            yield (cx + dx, cy + ring)
+        for dy in range(-ring + 1, ring):
+            yield (cx - ring, cy + dy)
+            yield (cx + ring, cy + dy)